@@ -0,0 +1,280 @@
+import heapq
+import threading
+from bisect import bisect_left, insort
+from collections import namedtuple
+from django.db.models import Count, Sum
+from django.urls import reverse
+from core.search import tokenize
+
+# Suggestions returned per kind.
+SUGGESTIONS = 8
+# Prefixes up to this long have their suggestions precomputed; they match too
+# many keys to scan on every keystroke.
+SHORT_PREFIX = 3
+# Longer prefixes scan at most this many keys, and remember their answer.
+MAX_SCAN = 2000
+MAX_CACHED = 5000
+
+Suggestion = namedtuple('Suggestion', 'label url weight keys')
+
+
+def normalize(text):
+    return ' '.join(tokenize(text))
+
+
+def keys_for(label):
+    # The whole label plus every word start, so "head" finds "Wireless Headphones".
+    words = tokenize(label)
+    return sorted({' '.join(words[start:]) for start in range(len(words))})
+
+
+class PrefixIndex:
+    """Sorted array of (key, id) searched with bisect, weighted by popularity.
+
+    Answers come straight from memory: precomputed for short prefixes,
+    a bounded range scan (cached until the next change) for longer ones.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.keys = []
+        self.items = {}
+        self.top = {}
+        self.cache = {}
+
+    def rank(self, item_id):
+        item = self.items[item_id]
+        return (-item.weight, item.label.lower())
+
+    def load(self, rows):
+        # rows are (id, label, url, weight); replaces everything in one pass.
+        with self.lock:
+            self.items = {item_id: Suggestion(label, url, weight, keys_for(label)) for item_id, label, url, weight in rows}
+            self.keys = sorted((key, item_id) for item_id, item in self.items.items() for key in item.keys)
+            candidates = {}
+            for key, item_id in self.keys:
+                for length in range(1, min(SHORT_PREFIX, len(key)) + 1):
+                    candidates.setdefault(key[:length], set()).add(item_id)
+            self.top = {
+                prefix: heapq.nsmallest(SUGGESTIONS, item_ids, key=self.rank)
+                for prefix, item_ids in candidates.items()
+            }
+            self.cache = {}
+
+    def put(self, item_id, label, url, weight):
+        with self.lock:
+            old = self.items.get(item_id)
+            keys = keys_for(label)
+            self.items[item_id] = Suggestion(label, url, weight, keys)
+            self.cache = {}
+            stale = set()
+            worse = False
+            if old is not None:
+                if old.keys != keys:
+                    for key in old.keys:
+                        del self.keys[bisect_left(self.keys, (key, item_id))]
+                    stale = self._prefixes(old.keys)
+                worse = self.rank(item_id) > (-old.weight, old.label.lower())
+            if old is None or old.keys != keys:
+                for key in keys:
+                    insort(self.keys, (key, item_id))
+            current = self._prefixes(keys)
+            for prefix in stale - current:
+                self._rescan(prefix, item_id)
+            for prefix in current:
+                if worse:
+                    # It may have dropped below something the list left out.
+                    self._rescan(prefix, item_id)
+                self._offer(prefix, item_id)
+
+    def set_weight(self, item_id, weight):
+        item = self.items.get(item_id)
+        if item is not None and item.weight != weight:
+            self.put(item_id, item.label, item.url, weight)
+
+    def remove(self, item_id):
+        with self.lock:
+            old = self.items.pop(item_id, None)
+            if old is None:
+                return
+            self.cache = {}
+            for key in old.keys:
+                del self.keys[bisect_left(self.keys, (key, item_id))]
+            for prefix in self._prefixes(old.keys):
+                self._rescan(prefix, item_id)
+
+    def _prefixes(self, keys):
+        return {key[:length] for key in keys for length in range(1, min(SHORT_PREFIX, len(key)) + 1)}
+
+    def _offer(self, prefix, item_id):
+        top = [other for other in self.top.get(prefix, []) if other != item_id]
+        top.append(item_id)
+        top.sort(key=self.rank)
+        self.top[prefix] = top[:SUGGESTIONS]
+
+    def _rescan(self, prefix, item_id):
+        # Only a prefix whose suggestions included the item can have changed.
+        if item_id not in self.top.get(prefix, ()):
+            return
+        item_ids = self._scan(prefix, limit=None)
+        if item_ids:
+            self.top[prefix] = heapq.nsmallest(SUGGESTIONS, item_ids, key=self.rank)
+        else:
+            self.top.pop(prefix, None)
+
+    def _scan(self, prefix, limit=MAX_SCAN):
+        item_ids = set()
+        index = bisect_left(self.keys, (prefix,))
+        end = len(self.keys) if limit is None else min(len(self.keys), index + limit)
+        while index < end and self.keys[index][0].startswith(prefix):
+            item_ids.add(self.keys[index][1])
+            index += 1
+        return item_ids
+
+    def suggest(self, query, limit=SUGGESTIONS):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        with self.lock:
+            if len(prefix) <= SHORT_PREFIX:
+                item_ids = self.top.get(prefix, [])
+            else:
+                item_ids = self.cache.get(prefix)
+                if item_ids is None:
+                    item_ids = heapq.nsmallest(SUGGESTIONS, self._scan(prefix), key=self.rank)
+                    if len(self.cache) >= MAX_CACHED:
+                        self.cache = {}
+                    self.cache[prefix] = item_ids
+            return [self.items[item_id] for item_id in item_ids[:limit]]
+
+
+class Autocomplete:
+    """Product, category and tag suggestions for the search box.
+
+    Built from the database on first use, then kept current by the signals in
+    core/signals.py. Products are weighted by how many have been ordered,
+    categories and tags by how many products they hold. The hooks change
+    shared state only under the lock, so they wait out a load in progress.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.products = PrefixIndex()
+        self.categories = PrefixIndex()
+        self.tags = PrefixIndex()
+        self.ordered = {}
+        self.titles = {}
+        # Product id -> category id, to move a product's count when it changes category.
+        self.category_of = {}
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            with self.lock:
+                if not self.loaded:
+                    self.load()
+                    self.loaded = True
+
+    def load(self):
+        from core.models import Category, Product, CartOrderItems
+        from taggit.models import Tag
+
+        # Order lines only keep the product title, so popularity is counted by title.
+        self.ordered = dict(
+            CartOrderItems.objects.values('item').annotate(total=Sum('quantity')).values_list('item', 'total')
+        )
+        rows = []
+        self.titles = {}
+        self.category_of = {}
+        for product_id, pid, title, category_id in Product.objects.values_list('id', 'pid', 'title', 'category_id').iterator():
+            rows.append((product_id, title, reverse('core:product_details', args=[pid]), self.ordered.get(title) or 0))
+            self.titles.setdefault(title, set()).add(product_id)
+            self.category_of[product_id] = category_id
+        self.products.load(rows)
+        self.categories.load(
+            (category.id, category.title, reverse('core:category_products', args=[category.cid]), category.product_count)
+            for category in Category.objects.annotate(product_count=Count('category'))
+        )
+        self.tags.load(
+            (tag.id, tag.name, reverse('core:tags', args=[tag.slug]), tag.product_count)
+            for tag in Tag.objects.annotate(product_count=Count('taggit_taggeditem_items'))
+        )
+
+    def suggest(self, query):
+        self.ensure_loaded()
+        return {
+            'products': self.products.suggest(query),
+            'categories': self.categories.suggest(query, limit=3),
+            'tags': self.tags.suggest(query, limit=3),
+        }
+
+    # Signal hooks; nothing to keep current until the index has been built.
+
+    def product_saved(self, product):
+        url = reverse('core:product_details', args=[product.pid])
+        with self.lock:
+            if not self.loaded:
+                return
+            old = self.products.items.get(product.id)
+            if old is not None:
+                self.titles.get(old.label, set()).discard(product.id)
+            self.titles.setdefault(product.title, set()).add(product.id)
+            self.products.put(product.id, product.title, url, self.ordered.get(product.title) or 0)
+            old_category = self.category_of.get(product.id)
+            if old_category != product.category_id:
+                self.category_of[product.id] = product.category_id
+                self._count_category(old_category, -1)
+                self._count_category(product.category_id, 1)
+
+    def product_deleted(self, product):
+        with self.lock:
+            if not self.loaded:
+                return
+            self.titles.get(product.title, set()).discard(product.id)
+            self.products.remove(product.id)
+            self._count_category(self.category_of.pop(product.id, None), -1)
+
+    def _count_category(self, category_id, change):
+        category = self.categories.items.get(category_id)
+        if category is not None:
+            self.categories.set_weight(category_id, max(category.weight + change, 0))
+
+    def category_saved(self, category, product_count):
+        url = reverse('core:category_products', args=[category.cid])
+        with self.lock:
+            if self.loaded:
+                self.categories.put(category.id, category.title, url, product_count)
+
+    def category_deleted(self, category):
+        with self.lock:
+            if self.loaded:
+                self.categories.remove(category.id)
+
+    def tags_changed(self, tag_ids):
+        # Re-count the given tags; a tag on no products is dropped.
+        if not self.loaded:
+            return
+        from taggit.models import Tag
+        counted = [
+            (tag.id, tag.name, reverse('core:tags', args=[tag.slug]), tag.product_count)
+            for tag in Tag.objects.filter(id__in=tag_ids).annotate(product_count=Count('taggit_taggeditem_items'))
+        ]
+        with self.lock:
+            for tag_id, name, url, product_count in counted:
+                if product_count:
+                    self.tags.put(tag_id, name, url, product_count)
+                else:
+                    self.tags.remove(tag_id)
+            for tag_id in set(tag_ids) - {tag_id for tag_id, *_ in counted}:
+                self.tags.remove(tag_id)
+
+    def item_ordered(self, title, quantity):
+        with self.lock:
+            if not self.loaded:
+                return
+            self.ordered[title] = (self.ordered.get(title) or 0) + quantity
+            for product_id in self.titles.get(title, ()):
+                self.products.set_weight(product_id, self.ordered[title])
+
+
+autocomplete = Autocomplete()
@@ -0,0 +1,400 @@
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+
+PAGE_SIZE = 24
+# Tags offered as facets; the rest are still reachable through their tag page.
+TAG_FACETS = 20
+
+# (label, low, high) with high exclusive; None means unbounded.
+PRICE_BUCKETS = (
+    ('Under $25', None, Decimal('25')),
+    ('$25 - $50', Decimal('25'), Decimal('50')),
+    ('$50 - $100', Decimal('50'), Decimal('100')),
+    ('$100 - $250', Decimal('100'), Decimal('250')),
+    ('$250 & above', Decimal('250'), None),
+)
+# Minimum average rating a shopper can ask for.
+RATING_FACETS = (4, 3, 2, 1)
+# Filter sets whose facet counts are kept until the catalog changes.
+CACHED_COUNTS = 512
+# Moved on every catalog change; see FacetIndex.
+VERSION_KEY = 'listing:facet-version'
+
+# name -> (label, ordering); the last field always breaks ties so keysets are unique.
+SORTS = {
+    'newest': ('Newest', ('-id',)),
+    'price_low': ('Price: low to high', ('price', 'id')),
+    'price_high': ('Price: high to low', ('-price', '-id')),
+}
+DEFAULT_SORT = 'newest'
+
+
+def price_bucket(price):
+    for index, (_, low, high) in enumerate(PRICE_BUCKETS):
+        if (low is None or price >= low) and (high is None or price < high):
+            return index
+    return None
+
+
+def rating_bucket(rating_sum, rating_count):
+    # Whole stars of the average rating; 0 for an unreviewed product.
+    return rating_sum // rating_count if rating_count else 0
+
+
+def popcount(mask):
+    return mask.bit_count()
+
+
+class FacetIndex:
+    """Bitmaps of in-stock products per category, tag, price bucket and rating.
+
+    Each product gets a bit position; a facet value is the int with the bits
+    of its products set, so counting a facet under the other filters is a few
+    ANDs and a popcount rather than a scan of the catalog. Counts are kept
+    per filter set until the bitmaps change.
+
+    Built on first use and kept current by the signals in core/signals.py.
+    Every change also moves a version key in the cache, and a process whose
+    bitmaps were built at another version rebuilds them before counting, so
+    the cache has to be shared between processes (as for core/product_cache.py)
+    for changes made in one to reach the others.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.version = None
+        self._reset()
+
+    def _reset(self):
+        self.positions = {}
+        self.facets = {}
+        self.in_stock = 0
+        self.categories = {}
+        self.tags = {}
+        self.prices = [0] * len(PRICE_BUCKETS)
+        self.ratings = [0] * 6
+        self.cached_counts = OrderedDict()
+
+    def shared_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            # Start from the clock, so a version lost to eviction never matches an old build.
+            cache.add(VERSION_KEY, time.time_ns(), None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    def ensure_current(self):
+        version = self.shared_version()
+        if not self.loaded or version != self.version:
+            with self.lock:
+                if not self.loaded or version != self.version:
+                    self._reset()
+                    self.load()
+                    self.version = version
+                    self.loaded = True
+
+    def load(self):
+        from core.models import Product
+        from taggit.models import TaggedItem
+
+        tag_ids = {}
+        for product_id, tag_id in TaggedItem.objects.filter(
+            content_type__app_label='core', content_type__model='product',
+        ).values_list('object_id', 'tag_id').iterator():
+            tag_ids.setdefault(product_id, []).append(tag_id)
+        rows = Product.objects.values_list('id', 'category_id', 'price', 'in_stock', 'rating_sum', 'rating_count')
+        for product_id, category_id, price, in_stock, rating_sum, rating_count in rows.iterator():
+            self._set(product_id, (in_stock, category_id, tuple(sorted(tag_ids.get(product_id, ()))),
+                                   price_bucket(price), rating_bucket(rating_sum, rating_count)))
+
+    def _set(self, product_id, facets):
+        old = self.facets.get(product_id)
+        if old == facets:
+            return
+        position = self.positions.setdefault(product_id, len(self.positions))
+        bit = 1 << position
+        if old is not None:
+            self._toggle(bit, old, clear=True)
+        self.facets[product_id] = facets
+        self._toggle(bit, facets, clear=False)
+
+    def _toggle(self, bit, facets, clear):
+        in_stock, category_id, tag_ids, price, rating = facets
+        if not in_stock:
+            return
+        def apply(mask):
+            return mask & ~bit if clear else mask | bit
+        self.in_stock = apply(self.in_stock)
+        self.categories[category_id] = apply(self.categories.get(category_id, 0))
+        for tag_id in tag_ids:
+            self.tags[tag_id] = apply(self.tags.get(tag_id, 0))
+        if price is not None:
+            self.prices[price] = apply(self.prices[price])
+        self.ratings[rating] = apply(self.ratings[rating])
+
+    # Signal hooks. Both run once the change is committed: the row is read
+    # back then, and other processes only rebuild from committed data.
+
+    def product_saved(self, product):
+        transaction.on_commit(lambda: self._refresh(product.id))
+
+    def reviews_changed(self, product_id):
+        transaction.on_commit(lambda: self._refresh(product_id))
+
+    def remove(self, product_id):
+        transaction.on_commit(lambda: self._refresh(product_id, deleted=True))
+
+    def _refresh(self, product_id, deleted=False):
+        from core.models import Product
+        from taggit.models import TaggedItem
+
+        facets = None
+        if self.loaded and not deleted:
+            row = Product.objects.filter(pk=product_id).values_list(
+                'in_stock', 'category_id', 'price', 'rating_sum', 'rating_count',
+            ).first()
+            if row is not None:
+                in_stock, category_id, price, rating_sum, rating_count = row
+                tag_ids = TaggedItem.objects.filter(
+                    content_type__app_label='core', content_type__model='product', object_id=product_id,
+                ).values_list('tag_id', flat=True)
+                facets = (in_stock, category_id, tuple(sorted(tag_ids)), price_bucket(price),
+                          rating_bucket(rating_sum, rating_count))
+        with self.lock:
+            if self.loaded:
+                if facets is not None:
+                    self._set(product_id, facets)
+                else:
+                    old = self.facets.pop(product_id, None)
+                    if old is not None:
+                        self._toggle(1 << self.positions[product_id], old, clear=True)
+                self.cached_counts.clear()
+            try:
+                version = cache.incr(VERSION_KEY)
+            except ValueError:
+                cache.set(VERSION_KEY, time.time_ns(), None)
+            else:
+                # Only this change since our build: it is applied above, no rebuild needed.
+                if self.loaded and version == self.version + 1:
+                    self.version = version
+
+    def rating_mask(self, minimum):
+        mask = 0
+        for stars in range(minimum, 6):
+            mask |= self.ratings[stars]
+        return mask
+
+    def counts(self, base, selected):
+        """Facet counts under the current selection.
+
+        base limits the listing (a category or tag page); selected maps each
+        facet to the chosen values. Each facet is counted with every other
+        facet applied but not itself, so shoppers can widen a choice.
+        """
+        self.ensure_current()
+        key = (base.get('category'), base.get('tag'), tuple(sorted(selected['category'])),
+               tuple(sorted(selected['tag'])), tuple(sorted(selected['price'])), selected['rating'])
+        with self.lock:
+            counts = self.cached_counts.get(key)
+            if counts is not None:
+                self.cached_counts.move_to_end(key)
+                return counts
+
+            mask = self.in_stock
+            if base.get('category') is not None:
+                mask &= self.categories.get(base['category'], 0)
+            if base.get('tag') is not None:
+                mask &= self.tags.get(base['tag'], 0)
+
+            chosen = {}
+            if selected['category']:
+                chosen['category'] = self._union(self.categories, selected['category'])
+            if selected['tag']:
+                chosen['tag'] = self._union(self.tags, selected['tag'])
+            if selected['price']:
+                chosen['price'] = self._union(dict(enumerate(self.prices)), selected['price'])
+            if selected['rating']:
+                chosen['rating'] = self.rating_mask(selected['rating'])
+
+            def without(facet):
+                result = mask
+                for other, other_mask in chosen.items():
+                    if other != facet:
+                        result &= other_mask
+                return result
+
+            within = without('category')
+            categories = {category_id: popcount(within & bits) for category_id, bits in self.categories.items()}
+            within = without('tag')
+            popular = heapq.nlargest(TAG_FACETS, self.tags, key=lambda tag_id: popcount(self.tags[tag_id] & mask))
+            tags = {tag_id: popcount(within & self.tags[tag_id]) for tag_id in set(popular) | set(selected['tag'])}
+            within = without('price')
+            prices = [popcount(within & bits) for bits in self.prices]
+            within = without('rating')
+            ratings = {minimum: popcount(within & self.rating_mask(minimum)) for minimum in RATING_FACETS}
+            total = popcount(without(None))
+            counts = {'categories': categories, 'tags': tags, 'prices': prices, 'ratings': ratings, 'total': total}
+            self.cached_counts[key] = counts
+            while len(self.cached_counts) > CACHED_COUNTS:
+                self.cached_counts.popitem(last=False)
+        return counts
+
+    def _union(self, masks, keys):
+        mask = 0
+        for key in keys:
+            mask |= masks.get(key, 0)
+        return mask
+
+
+facet_index = FacetIndex()
+
+
+def _int_list(values):
+    result = []
+    for value in values:
+        try:
+            result.append(int(value))
+        except ValueError:
+            pass
+    return result
+
+
+class ProductListing:
+    """One page of a product listing: filters, facet counts, sort and keyset cursor.
+
+    Pages are fetched with WHERE (sort key, id) > (last seen) LIMIT n + 1, so
+    page 500 costs the same as page 1, and the facet counts come from the
+    in-memory FacetIndex.
+    """
+
+    def __init__(self, request, products, category=None, tag=None):
+        from core.models import Category
+        from taggit.models import Tag
+
+        params = request.GET
+        self.params = params
+        self.base = {'category': category.id if category else None, 'tag': tag.id if tag else None}
+        self.sort = params.get('sort') if params.get('sort') in SORTS else DEFAULT_SORT
+        self.selected = {
+            'category': _int_list(params.getlist('category')),
+            'tag': _int_list(params.getlist('tag')),
+            'price': [index for index in _int_list(params.getlist('price')) if 0 <= index < len(PRICE_BUCKETS)],
+            'rating': next((value for value in _int_list(params.getlist('rating')) if value in RATING_FACETS), None),
+        }
+
+        counts = facet_index.counts(self.base, self.selected)
+        self.total = counts['total']
+        category_titles = dict(Category.objects.filter(id__in=counts['categories']).values_list('id', 'title'))
+        tag_names = dict(Tag.objects.filter(id__in=counts['tags']).values_list('id', 'name'))
+        self.facets = {
+            'categories': sorted(
+                ({'id': category_id, 'label': category_titles[category_id], 'count': count,
+                  'selected': category_id in self.selected['category']}
+                 for category_id, count in counts['categories'].items()
+                 if category_id in category_titles and (count or category_id in self.selected['category'])),
+                key=lambda facet: facet['label'],
+            ),
+            'tags': sorted(
+                ({'id': tag_id, 'label': tag_names[tag_id], 'count': count,
+                  'selected': tag_id in self.selected['tag']}
+                 for tag_id, count in counts['tags'].items()
+                 if tag_id in tag_names and (count or tag_id in self.selected['tag'])),
+                key=lambda facet: -facet['count'],
+            ),
+            'prices': [
+                {'id': index, 'label': label, 'count': count, 'selected': index in self.selected['price']}
+                for index, ((label, _, _), count) in enumerate(zip(PRICE_BUCKETS, counts['prices']))
+            ],
+            'ratings': [
+                {'id': minimum, 'label': f'{minimum}★ & up', 'count': counts['ratings'][minimum],
+                 'selected': minimum == self.selected['rating']}
+                for minimum in RATING_FACETS
+            ],
+        }
+        self.sorts = [{'id': name, 'label': label, 'selected': name == self.sort} for name, (label, _) in SORTS.items()]
+
+        self.products, self.next_cursor = self.page(self.filter(products))
+
+    def filter(self, products):
+        if self.selected['category']:
+            products = products.filter(category_id__in=self.selected['category'])
+        if self.selected['tag']:
+            products = products.filter(tags__id__in=self.selected['tag']).distinct()
+        if self.selected['price']:
+            price_filter = Q()
+            for index in self.selected['price']:
+                _, low, high = PRICE_BUCKETS[index]
+                bucket = Q()
+                if low is not None:
+                    bucket &= Q(price__gte=low)
+                if high is not None:
+                    bucket &= Q(price__lt=high)
+                price_filter |= bucket
+            products = products.filter(price_filter)
+        if self.selected['rating']:
+            # Average >= n without dividing: rating_sum >= n * rating_count
+            products = products.filter(rating_count__gt=0, rating_sum__gte=F('rating_count') * self.selected['rating'])
+        return products
+
+    def page(self, products):
+        ordering = SORTS[self.sort][1]
+        cursor = self.read_cursor(ordering)
+        self.first_page = cursor is None
+        if cursor is not None:
+            products = products.filter(self.after(ordering, cursor))
+        rows = list(products.select_related('category').order_by(*ordering)[:PAGE_SIZE + 1])
+        next_cursor = None
+        if len(rows) > PAGE_SIZE:
+            rows = rows[:PAGE_SIZE]
+            last = rows[-1]
+            # Signed with its sort, so it is never read against another ordering.
+            next_cursor = signing.dumps(
+                [self.sort, [str(getattr(last, field.lstrip('-'))) for field in ordering]], salt='core.listing',
+            )
+        return rows, next_cursor
+
+    def read_cursor(self, ordering):
+        # None (the first page) for a missing or tampered cursor, or one made for another sort.
+        try:
+            sort, values = signing.loads(self.params.get('after', ''), salt='core.listing')
+        except (signing.BadSignature, TypeError, ValueError):
+            return None
+        if sort != self.sort or not isinstance(values, list) or len(values) != len(ordering):
+            return None
+        return values
+
+    def after(self, ordering, values):
+        # Rows strictly after the cursor in (field1, field2, ...) order.
+        condition = Q()
+        for depth in range(len(ordering) - 1, -1, -1):
+            field = ordering[depth].lstrip('-')
+            lookup = 'lt' if ordering[depth].startswith('-') else 'gt'
+            step = Q(**{f'{field}__{lookup}': values[depth]})
+            for earlier in range(depth):
+                step &= Q(**{ordering[earlier].lstrip('-'): values[earlier]})
+            condition |= step
+        return condition
+
+    def first_page_query(self):
+        # The same filters and sort, back at the first page.
+        params = self.params.copy()
+        params.pop('after', None)
+        return params.urlencode()
+
+    def next_page_query(self):
+        if self.next_cursor is None:
+            return None
+        params = self.params.copy()
+        params['after'] = self.next_cursor
+        return params.urlencode()
+
+    def is_first_page(self):
+        return self.first_page
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from core import ratings
+
+
+class Command(BaseCommand):
+    help = "Recount every product's rating totals and star histogram from its reviews."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only report products whose totals are wrong; exits with an error if there are any.',
+        )
+
+    def handle(self, *args, **options):
+        wrong = ratings.rebuild(fix=not options['check'])
+        if not wrong:
+            self.stdout.write(self.style.SUCCESS('All product rating totals match their reviews.'))
+        elif options['check']:
+            raise CommandError(f'{len(wrong)} product(s) have wrong rating totals: {", ".join(map(str, wrong[:20]))}')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Fixed the rating totals of {len(wrong)} product(s).'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from core.search import FTS5Index, product_search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product search index from the catalog.'
+
+    def handle(self, *args, **options):
+        product_search.rebuild()
+        backend = 'FTS5' if isinstance(product_search.get_backend(), FTS5Index) else 'in-memory'
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the {backend} product search index.'))
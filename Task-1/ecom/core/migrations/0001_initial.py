@@ -0,0 +1,153 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:00
+
+import ckeditor_uploader.fields
+import django.db.models.deletion
+import shortuuid.django_fields
+import taggit.managers
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cid', shortuuid.django_fields.ShortUUIDField(alphabet='abcdefgh12345', length=10, max_length=30, prefix='cat', unique=True)),
+                ('title', models.CharField(default='Category Title', max_length=100)),
+            ],
+            options={
+                'verbose_name_plural': 'Categories',
+            },
+        ),
+        migrations.CreateModel(
+            name='Subscribe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.CharField(blank=True, max_length=200, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Subscribes',
+            },
+        ),
+        migrations.CreateModel(
+            name='Tags',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Address',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address', models.CharField(max_length=100, null=True)),
+                ('phone_number', models.CharField(max_length=100)),
+                ('status', models.BooleanField(default=False)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Address',
+            },
+        ),
+        migrations.CreateModel(
+            name='CartOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('full_name', models.CharField(blank=True, max_length=200, null=True)),
+                ('email', models.CharField(blank=True, max_length=200, null=True)),
+                ('phone_number', models.CharField(blank=True, max_length=100, null=True)),
+                ('address', models.CharField(blank=True, max_length=100, null=True)),
+                ('payment_method', models.CharField(choices=[('cash on delivery', 'Cash on Delivery'), ('credit card', 'Credit Card'), ('paypal', 'PayPal')], max_length=30)),
+                ('price', models.DecimalField(decimal_places=2, default='0.00', max_digits=12)),
+                ('paid_status', models.BooleanField(default=False)),
+                ('order_date', models.DateTimeField(auto_now_add=True)),
+                ('order_status', models.CharField(choices=[('processing', 'Processing'), ('shipped', 'Shipped'), ('delivered', 'Delivered')], default='processing', max_length=20)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Cart Order',
+            },
+        ),
+        migrations.CreateModel(
+            name='CartOrderItems',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('invoice_number', models.CharField(max_length=200)),
+                ('item', models.CharField(max_length=200)),
+                ('image', models.CharField(max_length=200)),
+                ('quantity', models.IntegerField(default=1)),
+                ('price', models.DecimalField(decimal_places=2, default='0.00', max_digits=12)),
+                ('total', models.DecimalField(decimal_places=2, default='0.00', max_digits=12)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.cartorder')),
+            ],
+            options={
+                'verbose_name_plural': 'Cart Order Items',
+            },
+        ),
+        migrations.CreateModel(
+            name='Product',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pid', shortuuid.django_fields.ShortUUIDField(alphabet='abcdefgh12345', length=10, max_length=30, prefix='prod', unique=True)),
+                ('title', models.CharField(default='Product Title', max_length=100)),
+                ('image', models.ImageField(default='product.jpg', upload_to='product')),
+                ('description', ckeditor_uploader.fields.RichTextUploadingField(blank=True, default='This is the product', null=True)),
+                ('price', models.DecimalField(decimal_places=2, default='0.00', max_digits=12)),
+                ('old_price', models.DecimalField(blank=True, decimal_places=2, default='0.00', max_digits=12)),
+                ('in_stock', models.BooleanField(default=True)),
+                ('stock_count', models.IntegerField(blank=True, default=10, null=True)),
+                ('featured', models.BooleanField(default=False)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category', to='core.category')),
+                ('tags', taggit.managers.TaggableManager(blank=True, help_text='A comma-separated list of tags.', through='taggit.TaggedItem', to='taggit.Tag', verbose_name='Tags')),
+            ],
+            options={
+                'verbose_name_plural': 'Products',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductImages',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('images', models.ImageField(default='product.jpg', upload_to='product')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_images', to='core.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Product Images',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductReview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('review', models.TextField()),
+                ('rating', models.IntegerField(choices=[(1, '✭☆☆☆☆'), (2, '✭✭☆☆☆'), (3, '✭✭✭☆☆'), (4, '✭✭✭✭☆'), (5, '✭✭✭✭✭')], default=None)),
+                ('date', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='core.product')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Product Reviews',
+            },
+        ),
+        migrations.CreateModel(
+            name='Wishlist',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.product')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Wishlists',
+            },
+        ),
+    ]
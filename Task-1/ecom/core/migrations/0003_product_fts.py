@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:30
+
+from django.db import migrations
+from core.search import product_fields
+
+
+class SQLiteRunSQL(migrations.RunSQL):
+    # FTS5 is SQLite's; on other databases search uses the in-memory index.
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+def index_products(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Product = apps.get_model('core', 'Product')
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+    tag_names = {}
+    for product_id, name in TaggedItem.objects.filter(
+        content_type__app_label='core', content_type__model='product',
+    ).values_list('object_id', 'tag__name'):
+        tag_names.setdefault(product_id, []).append(name)
+    rows = []
+    for product in Product.objects.only('id', 'title', 'description').iterator(chunk_size=2000):
+        fields = product_fields(product, tag_names.get(product.id, []))
+        rows.append((product.id, fields['title'], fields['description'], fields['tags']))
+    with schema_editor.connection.cursor() as cursor:
+        # Earlier code created the table on first search, possibly with rows in it.
+        cursor.execute("DELETE FROM core_product_fts")
+        cursor.executemany(
+            "INSERT INTO core_product_fts (rowid, title, description, tags) VALUES (%s, %s, %s, %s)", rows,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_product_ratings'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+    ]
+
+    operations = [
+        SQLiteRunSQL(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS core_product_fts USING fts5(title, description, tags, tokenize='unicode61')",
+            "DROP TABLE IF EXISTS core_product_fts",
+        ),
+        migrations.RunPython(index_products, migrations.RunPython.noop),
+    ]
@@ -57,19 +57,56 @@ class Product(models.Model):
     stock_count = models.IntegerField(default=10, null=True, blank=True)
     featured = models.BooleanField(default=False)
 
+    # Review totals, kept current by core/ratings.py so pages don't aggregate reviews
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, editable=False)
+
     class Meta:
         verbose_name_plural = "Products"
 
+    def save(self, *args, **kwargs):
+        # The rating totals only change through core/ratings.py's F() updates;
+        # writing back the values loaded with this instance could undo them.
+        if not self._state.adding and not kwargs.get("force_insert") and kwargs.get("update_fields") is None:
+            from core.ratings import RATING_FIELDS
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in RATING_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     def product_image(self):
         return mark_safe('<img src="/media/%s" width="50" height="50" />' % (self.image))
 
     def __str__(self):
         return self.title
-    
+
     def get_percentage(self):
         percentage = ((self.old_price - self.price) / self.old_price) * 100
         return int(percentage)
 
+    def average_rating(self):
+        if not self.rating_count:
+            return None
+        return self.rating_sum / self.rating_count
+
+    def rating_stars(self):
+        # Font Awesome icon per star, rounded to the nearest half
+        halves = round((self.average_rating() or 0) * 2)
+        return ["fa-star"] * (halves // 2) + ["fa-star-half-o"] * (halves % 2) + ["fa-star-o"] * (5 - (halves + 1) // 2)
+
+    def rating_histogram(self):
+        # (stars, reviews, percent of reviews), five stars first
+        return [
+            (stars, getattr(self, f"rating_{stars}"), round(100 * getattr(self, f"rating_{stars}") / self.rating_count) if self.rating_count else 0)
+            for stars in range(5, 0, -1)
+        ]
+
     
 class ProductImages(models.Model):
     images = models.ImageField(upload_to="product", default="product.jpg")
@@ -0,0 +1,121 @@
+import time
+from collections import namedtuple
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# Related products shown under a product.
+RELATED_PRODUCTS = 12
+
+# Everything product_details shows that is the same for every visitor.
+ProductPage = namedtuple('ProductPage', 'product images tags reviews related version')
+
+
+def page_timeout():
+    # Seconds a cached page may live; versions make it stale long before that.
+    return getattr(settings, 'PRODUCT_PAGE_CACHE_TIMEOUT', 60 * 60)
+
+
+def _pid_key(pid):
+    return f'product-page:pid:{pid}'
+
+
+def _version_key(kind, key):
+    return f'product-page:{kind}-version:{key}'
+
+
+def _versions(product_id, category_id):
+    keys = [_version_key('product', product_id), _version_key('category', category_id)]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # Start from the clock, so a version lost to eviction can't bring back old pages.
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return '%s.%s' % tuple(found[key] for key in keys)
+
+
+def _bump(kind, key):
+    # After commit: a page rebuilt before then would cache the old rows under the new version.
+    def bump():
+        try:
+            cache.incr(_version_key(kind, key))
+        except ValueError:
+            cache.set(_version_key(kind, key), time.time_ns(), None)
+    transaction.on_commit(bump)
+
+
+def _load(product_id, version):
+    from core.models import Product
+
+    product = Product.objects.select_related('category').get(pk=product_id)
+    return ProductPage(
+        product=product,
+        images=list(product.product_images.all()),
+        tags=list(product.tags.all()),
+        reviews=list(product.reviews.select_related('user__profile').order_by('-date')),
+        related=list(Product.objects.filter(category_id=product.category_id).exclude(pk=product.pk)[:RELATED_PRODUCTS]),
+        version=version,
+    )
+
+
+def product_page(pid):
+    """The cached ProductPage for pid; raises Product.DoesNotExist like a get().
+
+    Pages are cached under the product's version and its category's version
+    (the related products), which the signals in core/signals.py bump on
+    every change, so nothing has to find and delete old entries. The cache
+    has to be shared between processes (Memcached, Redis) for a change made
+    in one of them to reach the others.
+    """
+    from core.models import Product
+
+    ids = cache.get(_pid_key(pid))
+    if ids is None:
+        product = Product.objects.only('id', 'category_id').get(pid=pid)
+        ids = (product.id, product.category_id)
+        cache.set(_pid_key(pid), ids, None)
+    version = _versions(*ids)
+    key = f'product-page:{ids[0]}:{version}'
+    page = cache.get(key)
+    if page is None:
+        try:
+            page = _load(ids[0], version)
+        except Product.DoesNotExist:
+            cache.delete(_pid_key(pid))
+            raise
+        cache.set(key, page, page_timeout())
+    if page.product.pid != pid:
+        # The product was given a new pid; the old one is gone.
+        cache.delete(_pid_key(pid))
+        raise Product.DoesNotExist
+    return page
+
+
+# Invalidation, called from core/signals.py.
+
+def product_changed(product_id, category_id=None):
+    _bump('product', product_id)
+    if category_id is not None:
+        # Its card appears among its category's related products.
+        _bump('category', category_id)
+
+
+def product_saved(product):
+    old = cache.get(_pid_key(product.pid))
+    cache.set(_pid_key(product.pid), (product.id, product.category_id), None)
+    if old is not None and old[1] != product.category_id:
+        _bump('category', old[1])
+    product_changed(product.id, product.category_id)
+
+
+def product_deleted(product):
+    cache.delete(_pid_key(product.pid))
+    product_changed(product.id, product.category_id)
+
+
+def reviews_changed(product_id):
+    # The product's stars also show on its related-product cards.
+    from core.models import Product
+    category_id = Product.objects.filter(pk=product_id).values_list('category_id', flat=True).first()
+    product_changed(product_id, category_id)
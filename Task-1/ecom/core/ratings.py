@@ -0,0 +1,71 @@
+from django.db import transaction
+from django.db.models import Count, F
+
+STARS = range(1, 6)
+RATING_FIELDS = ['rating_sum', 'rating_count'] + [f'rating_{stars}' for stars in STARS]
+
+
+def add_review(product_id, rating, sign=1):
+    """Count a review in (sign=1) or out (sign=-1) of its product's totals.
+
+    A single UPDATE with F() expressions, so concurrent reviews can't lose
+    each other's counts the way a read-modify-save would.
+    """
+    from core.models import Product
+
+    rating = int(rating)
+    field = f'rating_{rating}'
+    Product.objects.filter(pk=product_id).update(**{
+        'rating_sum': F('rating_sum') + sign * rating,
+        'rating_count': F('rating_count') + sign,
+        field: F(field) + sign,
+    })
+
+
+def remove_review(product_id, rating):
+    add_review(product_id, rating, sign=-1)
+
+
+def move_review(old_product_id, old_rating, product_id, rating):
+    # An edited review: take the old rating out and put the new one in.
+    if (old_product_id, int(old_rating)) == (product_id, int(rating)):
+        return
+    with transaction.atomic():
+        remove_review(old_product_id, old_rating)
+        add_review(product_id, rating)
+
+
+def counted_totals():
+    """{product id: {field: value}} counted from the reviews themselves."""
+    from core.models import ProductReview
+
+    totals = {}
+    for product_id, rating, count in ProductReview.objects.values_list('product', 'rating').annotate(count=Count('id')).order_by():
+        row = totals.setdefault(product_id, dict.fromkeys(RATING_FIELDS, 0))
+        row['rating_sum'] += rating * count
+        row['rating_count'] += count
+        row[f'rating_{rating}'] += count
+    return totals
+
+
+def rebuild(fix=True, batch_size=500):
+    """Compare every product's stored totals with its reviews.
+
+    Returns the ids of products whose totals were wrong, after correcting
+    them unless fix is False.
+    """
+    from core.models import Product
+
+    totals = counted_totals()
+    empty = dict.fromkeys(RATING_FIELDS, 0)
+    wrong = []
+    for product in Product.objects.only('id', *RATING_FIELDS).iterator(chunk_size=2000):
+        counted = totals.get(product.id, empty)
+        if any(getattr(product, field) != value for field, value in counted.items()):
+            for field, value in counted.items():
+                setattr(product, field, value)
+            wrong.append(product)
+    if fix and wrong:
+        with transaction.atomic():
+            Product.objects.bulk_update(wrong, RATING_FIELDS, batch_size=batch_size)
+    return [product.id for product in wrong]
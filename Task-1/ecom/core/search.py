@@ -0,0 +1,222 @@
+import html
+import math
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter
+from django.db import connection
+from django.utils.html import strip_tags
+
+# BM25 parameters and how much a match counts in each field.
+K1 = 1.2
+B = 0.75
+FIELD_WEIGHTS = {'title': 3.0, 'tags': 2.0, 'description': 1.0}
+
+# Vocabulary terms a single prefix may expand to in the Python index.
+MAX_PREFIX_TERMS = 64
+
+FTS_TABLE = 'core_product_fts'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+def product_fields(product, tag_names=None):
+    # Title, description without the CKEditor markup, and tag names.
+    if tag_names is None:
+        tag_names = [tag.name for tag in product.tags.all()]
+    description = html.unescape(strip_tags(product.description or ''))
+    return {'title': product.title or '', 'description': description, 'tags': ' '.join(tag_names)}
+
+
+class InvertedIndex:
+    """In-memory BM25 index, used when the database has no FTS5.
+
+    Postings map term -> {product id: weighted term frequency}. The
+    vocabulary is kept sorted so prefixes expand with a bisect instead of a
+    scan, and a query only touches the postings of its own terms.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.postings = {}
+        self.vocabulary = []
+        self.lengths = {}
+        self.total_length = 0.0
+
+    def add(self, doc_id, fields):
+        with self.lock:
+            self._remove(doc_id)
+            frequencies = Counter()
+            for field, text in fields.items():
+                weight = FIELD_WEIGHTS.get(field, 1.0)
+                for term in tokenize(text):
+                    frequencies[term] += weight
+            for term, frequency in frequencies.items():
+                postings = self.postings.get(term)
+                if postings is None:
+                    postings = self.postings[term] = {}
+                    self.vocabulary.insert(bisect_left(self.vocabulary, term), term)
+                postings[doc_id] = frequency
+            length = sum(frequencies.values())
+            self.lengths[doc_id] = (length, tuple(frequencies))
+            self.total_length += length
+
+    def remove(self, doc_id):
+        with self.lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        entry = self.lengths.pop(doc_id, None)
+        if entry is None:
+            return
+        length, terms = entry
+        self.total_length -= length
+        for term in terms:
+            postings = self.postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[term]
+                del self.vocabulary[bisect_left(self.vocabulary, term)]
+
+    def expand(self, prefix):
+        start = bisect_left(self.vocabulary, prefix)
+        terms = []
+        for term in self.vocabulary[start:start + MAX_PREFIX_TERMS]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def search(self, query, limit):
+        with self.lock:
+            count = len(self.lengths)
+            if not count:
+                return []
+            average = self.total_length / count
+            scores = None
+            # Rarest terms first, so the candidate set only shrinks from there.
+            for terms in sorted((self.expand(token) for token in tokenize(query)), key=self._matches):
+                token_scores = Counter()
+                # Every query term also matches as a prefix: "head" finds "headphones".
+                for term in terms:
+                    postings = self.postings[term]
+                    idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for doc_id, frequency in postings.items():
+                        if scores is not None and doc_id not in scores:
+                            continue
+                        length = self.lengths[doc_id][0]
+                        token_scores[doc_id] += idf * frequency * (K1 + 1) / (frequency + K1 * (1 - B + B * length / average))
+                # Like FTS5, a product has to match every term of the query.
+                if scores is not None:
+                    token_scores.update({doc_id: scores[doc_id] for doc_id in token_scores})
+                scores = token_scores
+                if not scores:
+                    break
+            return [doc_id for doc_id, _ in scores.most_common(limit)] if scores else []
+
+    def _matches(self, terms):
+        return sum(len(self.postings[term]) for term in terms)
+
+
+class FTS5Index:
+    """SQLite FTS5 table holding the same fields, ranked with its bm25().
+
+    The table is created and first filled by migration core.0003_product_fts.
+    """
+
+    def exists(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            return cursor.fetchone() is not None
+
+    def add(self, doc_id, fields):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [doc_id])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, description, tags) VALUES (%s, %s, %s, %s)",
+                [doc_id, fields['title'], fields['description'], fields['tags']],
+            )
+
+    def remove(self, doc_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [doc_id])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+    def search(self, query, limit):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        # Quoted tokens can't be read as FTS5 syntax; the trailing * makes each a prefix.
+        match = ' '.join('"%s"*' % token.replace('"', '""') for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"ORDER BY bm25({FTS_TABLE}, %s, %s, %s) LIMIT %s",
+                [match, FIELD_WEIGHTS['title'], FIELD_WEIGHTS['description'], FIELD_WEIGHTS['tags'], limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class ProductSearch:
+    """Product search over title, description and tags.
+
+    Uses the FTS5 table when the database is SQLite and has been migrated,
+    otherwise an in-memory InvertedIndex built on first use. Either one is
+    kept current from the Product signals in core/signals.py; the in-memory
+    index only sees saves made by its own process.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self.lock = threading.Lock()
+
+    def get_backend(self):
+        if self.backend is None:
+            with self.lock:
+                if self.backend is None:
+                    self.backend = self._open()
+        return self.backend
+
+    def _open(self):
+        if connection.vendor == 'sqlite':
+            fts = FTS5Index()
+            if fts.exists():
+                return fts
+        index = InvertedIndex()
+        self._fill(index)
+        return index
+
+    def _fill(self, backend):
+        from core.models import Product
+        for product in Product.objects.prefetch_related('tags').iterator(chunk_size=2000):
+            backend.add(product.id, product_fields(product, [tag.name for tag in product.tags.all()]))
+
+    def rebuild(self):
+        backend = self.get_backend()
+        if isinstance(backend, FTS5Index):
+            backend.clear()
+            self._fill(backend)
+        else:
+            with self.lock:
+                self.backend = InvertedIndex()
+                self._fill(self.backend)
+
+    def update(self, product):
+        self.get_backend().add(product.id, product_fields(product))
+
+    def remove(self, product_id):
+        self.get_backend().remove(product_id)
+
+    def search(self, query, limit=60):
+        """Ids of the best-matching products, best first."""
+        return self.get_backend().search(query, limit)
+
+
+product_search = ProductSearch()
@@ -0,0 +1,103 @@
+from django.db.models.signals import pre_save, post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+from taggit.models import Tag
+from core.models import Category, Product, ProductImages, ProductReview, CartOrderItems
+from userauths.models import Profile
+from core.search import product_search
+from core.autocomplete import autocomplete
+from core.listing import facet_index
+from core import product_cache, ratings
+
+
+# Keep the search index, autocomplete and listing facets in step with the catalog
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    product_search.update(instance)
+    autocomplete.product_saved(instance)
+    facet_index.product_saved(instance)
+    product_cache.product_saved(instance)
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    product_search.remove(instance.id)
+    autocomplete.product_deleted(instance)
+    facet_index.remove(instance.id)
+    product_cache.product_deleted(instance)
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def reindex_product_tags(sender, instance, action, pk_set, **kwargs):
+    if not isinstance(instance, Product):
+        return
+    if action == 'pre_clear':
+        # clear() doesn't say which tags it removed, so note them first
+        instance._cleared_tag_ids = list(instance.tags.values_list('id', flat=True))
+    # Tags are saved after the product itself, e.g. by the admin form
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        product_search.update(instance)
+        facet_index.product_saved(instance)
+        product_cache.product_changed(instance.id)
+        autocomplete.tags_changed(pk_set or getattr(instance, '_cleared_tag_ids', []))
+
+@receiver(pre_delete, sender=Product)
+def note_deleted_product_tags(sender, instance, **kwargs):
+    if autocomplete.loaded:
+        instance._cleared_tag_ids = list(instance.tags.values_list('id', flat=True))
+
+@receiver(post_delete, sender=Product)
+def recount_deleted_product_tags(sender, instance, **kwargs):
+    autocomplete.tags_changed(getattr(instance, '_cleared_tag_ids', []))
+
+@receiver(post_save, sender=Category)
+def index_category(sender, instance, **kwargs):
+    autocomplete.category_saved(instance, Product.objects.filter(category=instance).count())
+
+@receiver(post_delete, sender=Category)
+def unindex_category(sender, instance, **kwargs):
+    autocomplete.category_deleted(instance)
+
+@receiver(post_delete, sender=Tag)
+def unindex_tag(sender, instance, **kwargs):
+    autocomplete.tags_changed([instance.id])
+
+@receiver(post_save, sender=CartOrderItems)
+def count_ordered_item(sender, instance, created, **kwargs):
+    # Ordered products rank higher in the suggestions
+    if created:
+        autocomplete.item_ordered(instance.item, int(instance.quantity))
+
+# Keep each product's rating totals in step with its reviews
+@receiver(pre_save, sender=ProductReview)
+def note_stored_rating(sender, instance, **kwargs):
+    if instance.pk:
+        instance._stored_rating = ProductReview.objects.filter(pk=instance.pk).values_list('product', 'rating').first()
+
+@receiver(post_save, sender=ProductReview)
+def count_review(sender, instance, created, **kwargs):
+    stored = getattr(instance, '_stored_rating', None)
+    if created or stored is None:
+        ratings.add_review(instance.product_id, instance.rating)
+    else:
+        ratings.move_review(*stored, instance.product_id, instance.rating)
+    facet_index.reviews_changed(instance.product_id)
+    product_cache.reviews_changed(instance.product_id)
+    if stored is not None and stored[0] != instance.product_id:
+        facet_index.reviews_changed(stored[0])
+        product_cache.reviews_changed(stored[0])
+
+@receiver(post_delete, sender=ProductReview)
+def uncount_review(sender, instance, **kwargs):
+    ratings.remove_review(instance.product_id, instance.rating)
+    facet_index.reviews_changed(instance.product_id)
+    product_cache.reviews_changed(instance.product_id)
+
+# Cached product pages are keyed by version; these bump it
+@receiver(post_save, sender=ProductImages)
+@receiver(post_delete, sender=ProductImages)
+def expire_product_page_images(sender, instance, **kwargs):
+    product_cache.product_changed(instance.product_id)
+
+@receiver(post_save, sender=Profile)
+def expire_reviewed_product_pages(sender, instance, **kwargs):
+    # Reviews show their author's profile picture
+    for product_id in ProductReview.objects.filter(user_id=instance.user_id).values_list('product', flat=True).distinct():
+        product_cache.product_changed(product_id)
@@ -22,6 +22,7 @@ urlpatterns = [
     path('product-details/<str:pid>/', product_details, name='product_details'),  # URL for the product details page
     path('returns/', returns, name='returns'),  # URL for the returns & exhanges page
     path('search-results/', search_results, name='search_results'),  # URL for the search results page
+    path('search-autocomplete/', search_autocomplete, name='search_autocomplete'),  # URL for the search box suggestions
     path('shipping/', shipping, name='shipping'),  # URL for the shipping information page
     path('shop/', shop, name='shop'),  # URL for the shop now page
     path('terms/', terms, name='terms'),  # URL for the terms & conditions page
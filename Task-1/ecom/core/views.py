@@ -3,8 +3,12 @@ from django.shortcuts import get_object_or_404, redirect, render
 from django.http import HttpResponse, JsonResponse
 from core.models import Category, Product, ProductImages, ProductReview, Address, Wishlist, CartOrderItems, CartOrder, Subscribe
 from taggit.models import Tag
-from django.db.models import Count, Avg
+from django.db.models import Count
 from core.forms import ProductReviewForm
+from core.search import product_search
+from core.autocomplete import autocomplete
+from core.listing import ProductListing
+from core.product_cache import page_timeout, product_page
 from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
 from django.core import serializers
@@ -25,11 +29,12 @@ def about_us(request):
 
 def category_products(request, cid):
     category = Category.objects.get(cid=cid)
-    products = Product.objects.filter(in_stock=True, category=category)
+    listing = ProductListing(request, Product.objects.filter(in_stock=True, category=category), category=category)
 
     context = {
         "category" : category,
-        "products" : products
+        "listing" : listing,
+        "products" : listing.products
     }
     return render(request, 'core/category-products.html', context)
 
@@ -40,20 +45,21 @@ def privacy(request):
     return render(request, 'core/privacy.html')
 
 def product_details(request, pid):
-    product = Product.objects.get(pid=pid)
-    product_images = product.product_images.all()
-    products = Product.objects.filter(category=product.category).exclude(pid=pid)
-
-    reviews = ProductReview.objects.filter(product=product).order_by("-date")
+    # Shared parts come from the product page cache; the template caches its fragments under page.version
+    page = product_page(pid)
+    product = page.product
 
-    average_rating = ProductReview.objects.filter(product=product).aggregate(rating=Avg('rating'))
+    # Stored on the product, no aggregate over the reviews
+    average_rating = {'rating': product.average_rating()}
 
     review_form = ProductReviewForm()
 
+    # Per-user parts, never cached
     make_review = True
+    profile = None
 
     if request.user.is_authenticated:
-        profile = Profile.objects.get(user=request.user)
+        profile = Profile.objects.filter(user=request.user).first()
         user_review_count = ProductReview.objects.filter(user=request.user, product=product).count()
 
         if user_review_count > 0:
@@ -61,13 +67,16 @@ def product_details(request, pid):
 
     context = {
         'product' : product,
-        'product_images' : product_images,
-        'products' : products,
-        'reviews' : reviews,
+        'product_images' : page.images,
+        'tags' : page.tags,
+        'products' : page.related,
+        'reviews' : page.reviews,
         'average_rating' : average_rating,
         'review_form' : review_form,
         'make_review' : make_review,
-        'profile' : profile
+        'profile' : profile,
+        'page_version' : page.version,
+        'page_timeout' : page_timeout(),
     }
     return render(request, 'core/product-details.html', context)
 
@@ -77,7 +86,10 @@ def returns(request):
 def search_results(request):
     query = request.GET['search']
 
-    products = Product.objects.filter(title__icontains=query).order_by("-pid")
+    # Ranked ids from the search index, then one query for the products themselves
+    product_ids = product_search.search(query)
+    found = Product.objects.select_related('category').in_bulk(product_ids)
+    products = [found[product_id] for product_id in product_ids if product_id in found]
 
     context = {
         "products" : products,
@@ -85,14 +97,25 @@ def search_results(request):
     }
     return render(request, 'core/search-results.html', context)
 
+def search_autocomplete(request):
+    # Answered from the in-memory prefix index; no queries once it is built
+    suggestions = autocomplete.suggest(request.GET.get('q', ''))
+
+    return JsonResponse({
+        kind: [{'label': item.label, 'url': item.url} for item in items]
+        for kind, items in suggestions.items()
+    })
+
 def shipping(request):
     return render(request, 'core/shipping.html')
 
 def shop(request):
-    products = Product.objects.filter(in_stock=True)
+    # One page of the catalog at a time, with facet counts and sorting
+    listing = ProductListing(request, Product.objects.filter(in_stock=True))
 
     context = {
-        "products" : products,
+        "listing" : listing,
+        "products" : listing.products,
     }
     return render(request, 'core/shop.html', context)
 
@@ -117,8 +140,11 @@ def tag(request, tag_slug=None):
         tag = get_object_or_404(Tag, slug=tag_slug)
         products = products.filter(tags__in=[tag])
 
+    listing = ProductListing(request, products, tag=tag)
+
     context = {
-        "products" : products,
+        "listing" : listing,
+        "products" : listing.products,
         "tag" : tag
     }
     return render(request, "core/tag.html", context)
@@ -145,7 +171,9 @@ def ajax_add_review(request, pid):
         'profile_image_url': profile_image_url  # Include profile image URL in context
     }
 
-    average_reviews = ProductReview.objects.filter(product=product).aggregate(rating=Avg('rating'))
+    # The review signal has already added it to the product's totals
+    product.refresh_from_db(fields=['rating_sum', 'rating_count'])
+    average_reviews = {'rating': product.average_rating()}
 
     return JsonResponse(
         {
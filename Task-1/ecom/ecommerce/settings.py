@@ -179,3 +179,7 @@ CKEDITOR_CONFIGS = {
 }
 
 APPEND_SLASH=False
+
+# Product pages are cached under a version that core/signals.py bumps on every
+# change; with more than one process the cache must be shared (Memcached, Redis).
+PRODUCT_PAGE_CACHE_TIMEOUT = 60 * 60
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Game, GameMatrix
+from .models import Game, GameMatrix, GameRecord, PlayerRating, Tournament, TournamentEntry, TournamentMatch
 
 # Register your models here.
 @admin.register(Game)
@@ -8,4 +8,24 @@ class GameAdmin(admin.ModelAdmin):
 
 @admin.register(GameMatrix)
 class GameAdmin(admin.ModelAdmin):
-    list_display = ['id', 'game_code', 'matrix_map']
\ No newline at end of file
+    list_display = ['id', 'game_code', 'matrix_map', 'board_size', 'win_length']
+
+@admin.register(GameRecord)
+class GameRecordAdmin(admin.ModelAdmin):
+    list_display = ['id', 'game_code', 'game_creator', 'game_opponent', 'board_size', 'win_length', 'result', 'started', 'finished']
+
+@admin.register(PlayerRating)
+class PlayerRatingAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'rating', 'games', 'wins', 'losses', 'draws', 'updated']
+
+@admin.register(Tournament)
+class TournamentAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'format', 'board_size', 'win_length', 'current_round', 'rounds', 'status', 'created']
+
+@admin.register(TournamentEntry)
+class TournamentEntryAdmin(admin.ModelAdmin):
+    list_display = ['id', 'tournament', 'player_name', 'seed', 'score', 'byes', 'eliminated']
+
+@admin.register(TournamentMatch)
+class TournamentMatchAdmin(admin.ModelAdmin):
+    list_display = ['id', 'tournament', 'round', 'creator', 'opponent', 'game_code', 'game_matrix_id', 'result']
\ No newline at end of file
@@ -0,0 +1,337 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from django.conf import settings
+from . import bitboard
+
+logger = logging.getLogger(__name__)
+
+# Player type for a human playing X against the server, and the name the
+# server plays O under.
+AI = 'ai'
+AI_NAME = 'Computer'
+
+WIN_SCORE = 1_000_000
+# Boards up to this many cells are solved outright on the event loop.
+EXACT_CELLS = 9
+# Symmetry reduction pays for itself on small boards only.
+SYMMETRY_MAX_SIZE = 4
+# Plies of the 3x3 game kept in the opening book.
+BOOK_PLIES = 2
+# Search nodes between deadline checks.
+CHECK_EVERY = 1024
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+_executor = None
+
+
+def ai_budget():
+    return getattr(settings, 'GAME_AI_BUDGET', 0.5)
+
+
+def ai_processes():
+    return getattr(settings, 'GAME_AI_PROCESSES', 2)
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=ai_processes())
+    return _executor
+
+
+@lru_cache(maxsize=None)
+def symmetries(size):
+    # The eight rotations and reflections of the board, as cell permutations.
+    def cell(row, col):
+        return row * size + col
+    last = size - 1
+    maps = (
+        lambda r, c: (r, c), lambda r, c: (c, last - r), lambda r, c: (last - r, last - c),
+        lambda r, c: (last - c, r), lambda r, c: (r, last - c), lambda r, c: (last - r, c),
+        lambda r, c: (c, r), lambda r, c: (last - c, last - r),
+    )
+    return tuple(
+        tuple(cell(*move(row, col)) for row in range(size) for col in range(size))
+        for move in maps
+    )
+
+
+def transform(board, permutation):
+    result = 0
+    while board:
+        low = board & -board
+        result |= 1 << permutation[low.bit_length() - 1]
+        board ^= low
+    return result
+
+
+def canonical(x_board, o_board, size):
+    return min((transform(x_board, p), transform(o_board, p)) for p in symmetries(size))
+
+
+@lru_cache(maxsize=None)
+def neighbourhoods(size):
+    # Mask of the cells around each cell, used to keep big-board search local.
+    masks = []
+    for row in range(size):
+        for col in range(size):
+            mask = 0
+            for d_row in (-1, 0, 1):
+                for d_col in (-1, 0, 1):
+                    r, c = row + d_row, col + d_col
+                    if (d_row or d_col) and 0 <= r < size and 0 <= c < size:
+                        mask |= 1 << (r * size + c)
+            masks.append(mask)
+    return tuple(masks)
+
+
+@lru_cache(maxsize=None)
+def centre_order(size):
+    middle = (size - 1) / 2
+    return tuple(sorted(range(size * size), key=lambda cell: abs(cell // size - middle) + abs(cell % size - middle)))
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class Searcher:
+    """Negamax with alpha-beta pruning over bitboards.
+
+    Scores are from the side to move's point of view. The transposition
+    table is keyed by the canonical (symmetry-reduced) position on small
+    boards and by the raw position on larger ones.
+    """
+
+    def __init__(self, size, win_length, table=None, deadline=None):
+        self.size = size
+        self.win_length = win_length
+        self.full = bitboard.full_mask(size)
+        self.lines = bitboard.line_masks(size, win_length)
+        self.order = centre_order(size)
+        self.near = neighbourhoods(size)
+        self.symmetric = size <= SYMMETRY_MAX_SIZE
+        self.table = {} if table is None else table
+        self.deadline = deadline
+        self.nodes = 0
+
+    def key(self, me, opponent):
+        if self.symmetric:
+            return canonical(me, opponent, self.size)
+        return me, opponent
+
+    def candidates(self, me, opponent):
+        occupied = me | opponent
+        if self.size * self.size <= EXACT_CELLS or not occupied:
+            return [cell for cell in self.order if not occupied >> cell & 1]
+        near = 0
+        board = occupied
+        while board:
+            low = board & -board
+            near |= self.near[low.bit_length() - 1]
+            board ^= low
+        near &= ~occupied
+        return [cell for cell in self.order if near >> cell & 1]
+
+    def evaluate(self, me, opponent):
+        # Open lines weighted by how far along they are.
+        score = 0
+        for mask in self.lines:
+            mine = me & mask
+            theirs = opponent & mask
+            if mine and not theirs:
+                score += 4 ** bitboard.count_cells(mine)
+            elif theirs and not mine:
+                score -= 4 ** bitboard.count_cells(theirs)
+        # Long lines on big boards must never look like a forced win.
+        return max(-WIN_SCORE // 2, min(WIN_SCORE // 2, score))
+
+    def negamax(self, me, opponent, last, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.deadline is not None and self.nodes % CHECK_EVERY == 0 and time.monotonic() > self.deadline:
+            raise SearchTimeout()
+        if last is not None and bitboard.wins_through(opponent, last, self.size, self.win_length):
+            return -(WIN_SCORE - ply)
+        if me | opponent == self.full:
+            return 0
+        if depth == 0:
+            return self.evaluate(me, opponent)
+
+        key = self.key(me, opponent)
+        entry = self.table.get(key)
+        original_alpha = alpha
+        if entry is not None and entry[0] >= depth:
+            _, flag, value = entry
+            if flag == EXACT:
+                return value
+            if flag == LOWER:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                return value
+
+        best = -WIN_SCORE - 1
+        for cell in self.candidates(me, opponent):
+            value = -self.negamax(opponent, me | (1 << cell), cell, depth - 1, -beta, -alpha, ply + 1)
+            if value > best:
+                best = value
+            if best > alpha:
+                alpha = best
+            if alpha >= beta:
+                break
+
+        flag = EXACT
+        if best <= original_alpha:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        self.table[key] = (depth, flag, best)
+        return best
+
+    def root(self, me, opponent, depth):
+        best_cell, best = None, -WIN_SCORE - 1
+        alpha = -WIN_SCORE - 1
+        for cell in self.candidates(me, opponent):
+            value = -self.negamax(opponent, me | (1 << cell), cell, depth - 1, -WIN_SCORE - 1, -alpha, 1)
+            if value > best:
+                best_cell, best = cell, value
+                alpha = max(alpha, value)
+        return best_cell, best
+
+
+def to_move(x_board, o_board):
+    # X always opens, so X is to move whenever the counts are level.
+    x_count = bitboard.count_cells(x_board)
+    o_count = bitboard.count_cells(o_board)
+    return (x_board, o_board) if x_count == o_count else (o_board, x_board)
+
+
+@lru_cache(maxsize=None)
+def exact_table(size, win_length):
+    # Shared across games: the 3x3 game has only 765 essentially distinct positions.
+    return {}
+
+
+def solve(x_board, o_board, size, win_length):
+    me, opponent = to_move(x_board, o_board)
+    searcher = Searcher(size, win_length, table=exact_table(size, win_length))
+    empty = size * size - bitboard.count_cells(x_board | o_board)
+    return searcher.root(me, opponent, empty)[0]
+
+
+@lru_cache(maxsize=None)
+def opening_book(size, win_length):
+    """Best replies for the first plies, worked out once per variant.
+
+    Small boards are solved exactly; larger ones just open in the centre.
+    """
+    book = {(0, 0): centre_order(size)[0]}
+    if size * size > EXACT_CELLS:
+        return book
+    frontier = [(0, 0)]
+    for ply in range(BOOK_PLIES):
+        following = []
+        for x_board, o_board in frontier:
+            book[(x_board, o_board)] = solve(x_board, o_board, size, win_length)
+            for cell in range(size * size):
+                if (x_board | o_board) >> cell & 1:
+                    continue
+                if ply % 2 == 0:
+                    following.append((x_board | (1 << cell), o_board))
+                else:
+                    following.append((x_board, o_board | (1 << cell)))
+        frontier = following
+    return book
+
+
+def best_move(x_board, o_board, size=bitboard.DEFAULT_SIZE, win_length=bitboard.DEFAULT_WIN_LENGTH, budget=None):
+    """Cell for the side to move; depth-limited within `budget` seconds on big boards."""
+    book = opening_book(size, win_length)
+    if (x_board, o_board) in book:
+        return book[(x_board, o_board)]
+    if size * size <= EXACT_CELLS:
+        return solve(x_board, o_board, size, win_length)
+
+    me, opponent = to_move(x_board, o_board)
+    deadline = time.monotonic() + (budget if budget is not None else ai_budget())
+    searcher = Searcher(size, win_length, deadline=deadline)
+    best = quick_move(x_board, o_board, size, win_length)
+    empty = size * size - bitboard.count_cells(x_board | o_board)
+    for depth in range(1, empty + 1):
+        try:
+            cell, value = searcher.root(me, opponent, depth)
+        except SearchTimeout:
+            break
+        best = cell
+        if abs(value) >= WIN_SCORE - depth:
+            break
+    return best
+
+
+def quick_move(x_board, o_board, size, win_length):
+    # Win if possible, otherwise block, otherwise the most central free cell.
+    me, opponent = to_move(x_board, o_board)
+    occupied = x_board | o_board
+    free = [cell for cell in centre_order(size) if not occupied >> cell & 1]
+    for board in (me, opponent):
+        for cell in free:
+            if bitboard.wins_through(board | (1 << cell), cell, size, win_length):
+                return cell
+    return free[0] if free else None
+
+
+def evaluate_position(x_board, o_board, size, win_length, budget):
+    """(best cell, value) for the side to move; exact on small boards."""
+    me, opponent = to_move(x_board, o_board)
+    empty = size * size - bitboard.count_cells(x_board | o_board)
+    if size * size <= EXACT_CELLS:
+        return Searcher(size, win_length, table=exact_table(size, win_length)).root(me, opponent, empty)
+
+    searcher = Searcher(size, win_length, deadline=time.monotonic() + budget)
+    best = None
+    for depth in range(1, empty + 1):
+        try:
+            best = searcher.root(me, opponent, depth)
+        except SearchTimeout:
+            break
+        if abs(best[1]) >= WIN_SCORE - depth:
+            break
+    if best is None:
+        # Not even one ply in budget: judge the position statically.
+        searcher.deadline = None
+        best = searcher.root(me, opponent, 1)
+    return best
+
+
+def evaluate_positions(positions, size, win_length, budget):
+    # Runs in game.analysis's worker processes, which import this module but
+    # never set Django up; positions are (x_board, o_board) pairs.
+    return [evaluate_position(x_board, o_board, size, win_length, budget) for x_board, o_board in positions]
+
+
+async def choose_move(x_board, o_board, size, win_length):
+    """The AI's box_id for this position without holding up the event loop.
+
+    Small boards come from the book or the shared transposition table;
+    larger ones are searched in a worker process and fall back to a quick
+    heuristic move if the budget runs out.
+    """
+    if size * size <= EXACT_CELLS:
+        cell = best_move(x_board, o_board, size, win_length)
+    else:
+        budget = ai_budget()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(executor(), best_move, x_board, o_board, size, win_length, budget)
+        try:
+            cell = await asyncio.wait_for(future, budget * 2)
+        except asyncio.TimeoutError:
+            cell = quick_move(x_board, o_board, size, win_length)
+        except Exception:
+            logger.exception('AI search failed for a %sx%s board', size, size)
+            cell = quick_move(x_board, o_board, size, win_length)
+    return None if cell is None else cell + 1
@@ -0,0 +1,218 @@
+import asyncio
+import logging
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from . import bitboard
+from .ai import WIN_SCORE, evaluate_positions, symmetries, transform
+from .bitboard import PLAYER_X
+from .db import game_sync_to_async
+from .models import GameRecord
+
+logger = logging.getLogger(__name__)
+
+# Scores beyond this are forced wins or losses rather than heuristics.
+DECIDED = WIN_SCORE // 2
+# Heuristic points a move may give away on big boards before it is a blunder.
+BLUNDER_MARGIN = 48
+
+BEST = 'best'
+GOOD = 'good'
+INACCURACY = 'inaccuracy'
+BLUNDER = 'blunder'
+
+# One analysed move; cells are box_ids, values are from the mover's side.
+MoveReview = namedtuple('MoveReview', 'seq box_id symbol best_box_id value best_value verdict')
+
+_executor = None
+
+
+def analysis_budget():
+    # Seconds of search per position on boards too big to solve outright.
+    return getattr(settings, 'GAME_ANALYSIS_BUDGET', 0.2)
+
+
+def analysis_processes():
+    return getattr(settings, 'GAME_ANALYSIS_PROCESSES', 1)
+
+
+def analysis_cache_size():
+    return getattr(settings, 'GAME_ANALYSIS_CACHE', 50_000)
+
+
+def executor():
+    # Kept apart from the AI's pool so a long analysis never delays a live move.
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=analysis_processes())
+    return _executor
+
+
+def canonical_key(x_board, o_board, size, win_length):
+    """Hash key shared by all eight rotations/reflections of a position.
+
+    Returns the key and the permutation that maps this position onto it.
+    """
+    return min(
+        ((size, win_length, transform(x_board, p), transform(o_board, p)), p)
+        for p in symmetries(size)
+    )
+
+
+def outcome(value):
+    return 1 if value > DECIDED else -1 if value < -DECIDED else 0
+
+
+def settled(value):
+    # A forced result's distance in plies is counted from wherever its search
+    # started (the shared exact table mixes many), so only the result compares.
+    return WIN_SCORE * outcome(value) if outcome(value) else value
+
+
+def verdict(played, best):
+    if played >= best:
+        return BEST
+    if outcome(played) < outcome(best):
+        # Threw away a forced win, or walked into a forced loss.
+        return BLUNDER
+    if best - played > BLUNDER_MARGIN:
+        return BLUNDER
+    return INACCURACY if best - played > BLUNDER_MARGIN // 4 else GOOD
+
+
+class PositionCache:
+    """LRU of (value, best cell) per canonical position, shared by every analysis."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > analysis_cache_size():
+            self.entries.popitem(last=False)
+
+
+def load_game(game_matrix_id):
+    record = GameRecord.objects.get(game_matrix_id=game_matrix_id)
+    if record.finished is None:
+        raise ValueError(f'game {game_matrix_id} has not finished')
+    moves = list(record.moves.order_by('seq').values_list('seq', 'cell', 'symbol'))
+    return record.board_size, record.win_length, moves
+
+
+class Analyzer:
+    """Reviews finished games move by move without touching the event loop's CPU.
+
+    Requests go through an asyncio queue drained by one task per analysis
+    process; every position is searched in the process pool, and results are
+    cached by canonical position so common openings are only searched once.
+    """
+
+    def __init__(self):
+        self.requests = None
+        self.cache = PositionCache()
+        self._tasks = []
+
+    def ensure_started(self):
+        if self._tasks and not any(task.done() for task in self._tasks):
+            return
+        for task in self._tasks:
+            task.cancel()
+        self.requests = asyncio.Queue()
+        self._tasks = [asyncio.ensure_future(self.run()) for _ in range(analysis_processes())]
+
+    def submit(self, game_matrix_id):
+        self.ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self.requests.put_nowait((game_matrix_id, future))
+        return future
+
+    async def run(self):
+        while True:
+            game_matrix_id, future = await self.requests.get()
+            if future.cancelled():
+                continue
+            try:
+                reviews = await self.analyse(game_matrix_id)
+            except Exception as error:
+                if not isinstance(error, (GameRecord.DoesNotExist, ValueError)):
+                    logger.exception('could not analyse game %s', game_matrix_id)
+                if not future.cancelled():
+                    future.set_exception(error)
+            else:
+                if not future.cancelled():
+                    future.set_result(reviews)
+
+    async def analyse(self, game_matrix_id):
+        size, win_length, moves = await game_sync_to_async(load_game)(game_matrix_id)
+
+        # The position before each move, and the one after the last.
+        positions = []
+        x_board = o_board = 0
+        for _, cell, symbol in moves:
+            positions.append((x_board, o_board))
+            if symbol == PLAYER_X:
+                x_board |= 1 << cell
+            else:
+                o_board |= 1 << cell
+        positions.append((x_board, o_board))
+
+        keys = [canonical_key(x, o, size, win_length) for x, o in positions]
+        evaluations = {}
+        missing = OrderedDict()
+        for (key, permutation), position in zip(keys, positions):
+            if key in evaluations or key in missing or self._terminal(position, size, win_length):
+                continue
+            cached = self.cache.get(key)
+            if cached is None:
+                missing[key] = (position, permutation)
+            else:
+                evaluations[key] = cached
+        if missing:
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(
+                executor(), evaluate_positions, [position for position, _ in missing.values()],
+                size, win_length, analysis_budget(),
+            )
+            for (key, (_, permutation)), (cell, value) in zip(missing.items(), results):
+                # Cells are stored in the canonical orientation.
+                evaluations[key] = (value, None if cell is None else permutation[cell])
+                self.cache.put(key, evaluations[key])
+
+        def lookup(index):
+            key, permutation = keys[index]
+            value, cell = evaluations[key]
+            return value, None if cell is None else permutation.index(cell)
+
+        reviews = []
+        for index, (seq, cell, symbol) in enumerate(moves):
+            best_value, best_cell = lookup(index)
+            best_value = settled(best_value)
+            after = positions[index + 1]
+            if self._terminal(after, size, win_length):
+                played = 0 if bitboard.winner(*after, size, win_length) is bitboard.DRAW else WIN_SCORE
+            else:
+                played = settled(-lookup(index + 1)[0])
+            reviews.append(MoveReview(
+                seq, cell + 1, symbol, None if best_cell is None else best_cell + 1,
+                played, best_value, BEST if cell == best_cell else verdict(played, best_value),
+            ))
+        return reviews
+
+    def _terminal(self, position, size, win_length):
+        return bitboard.winner(*position, size, win_length) is not bitboard.ONGOING
+
+
+analyzer = Analyzer()
@@ -0,0 +1,115 @@
+from functools import lru_cache
+
+# Same sentinels the matrix_map and check_winner already use.
+PLAYER_X = 44   # game creator ('null')
+PLAYER_O = 11   # opponent ('on')
+DRAW = False
+ONGOING = True
+
+DEFAULT_SIZE = 3
+DEFAULT_WIN_LENGTH = 3
+
+# Cell (row, col) lives at bit row * size + col, so box_id n is bit n - 1.
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+
+@lru_cache(maxsize=None)
+def line_masks(size=DEFAULT_SIZE, win_length=DEFAULT_WIN_LENGTH):
+    masks = []
+    for row in range(size):
+        for col in range(size):
+            for d_row, d_col in DIRECTIONS:
+                end_row = row + d_row * (win_length - 1)
+                end_col = col + d_col * (win_length - 1)
+                if not (0 <= end_row < size and 0 <= end_col < size):
+                    continue
+                mask = 0
+                for step in range(win_length):
+                    mask |= 1 << ((row + d_row * step) * size + col + d_col * step)
+                masks.append(mask)
+    return tuple(masks)
+
+
+@lru_cache(maxsize=None)
+def full_mask(size=DEFAULT_SIZE):
+    return (1 << (size * size)) - 1
+
+
+WIN_MASKS = line_masks()
+FULL_BOARD = full_mask()
+
+
+def winner(x_board, o_board, size=DEFAULT_SIZE, win_length=DEFAULT_WIN_LENGTH):
+    if size == DEFAULT_SIZE and win_length == DEFAULT_WIN_LENGTH:
+        masks, full = WIN_MASKS, FULL_BOARD
+    else:
+        masks, full = line_masks(size, win_length), full_mask(size)
+    for mask in masks:
+        if x_board & mask == mask:
+            return PLAYER_X
+        if o_board & mask == mask:
+            return PLAYER_O
+    if (x_board | o_board) == full:
+        return DRAW
+    return ONGOING
+
+
+def from_map(matrix_map):
+    x_board = o_board = 0
+    for index, cell in enumerate(matrix_map):
+        if cell == PLAYER_X:
+            x_board |= 1 << index
+        elif cell == PLAYER_O:
+            o_board |= 1 << index
+    return x_board, o_board
+
+
+def to_map(x_board, o_board, size=DEFAULT_SIZE):
+    matrix_map = []
+    for index in range(size * size):
+        bit = 1 << index
+        if x_board & bit:
+            matrix_map.append(PLAYER_X)
+        elif o_board & bit:
+            matrix_map.append(PLAYER_O)
+        else:
+            matrix_map.append(index + 1)
+    return matrix_map
+
+
+def wins_through(board, cell, size=DEFAULT_SIZE, win_length=DEFAULT_WIN_LENGTH):
+    # Only the four lines through the last move can have changed, and each
+    # is scanned at most win_length - 1 cells either side: O(K) per move.
+    row, col = divmod(cell, size)
+    for d_row, d_col in DIRECTIONS:
+        count = 1
+        for sign in (1, -1):
+            r, c = row + sign * d_row, col + sign * d_col
+            steps = 1
+            while steps < win_length and 0 <= r < size and 0 <= c < size and board >> (r * size + c) & 1:
+                count += 1
+                steps += 1
+                r += sign * d_row
+                c += sign * d_col
+        if count >= win_length:
+            return True
+    return False
+
+
+def count_cells(board):
+    return bin(board).count('1')
+
+
+def board_bytes(size):
+    return (size * size + 7) // 8
+
+
+def pack(x_board, o_board, size=DEFAULT_SIZE):
+    length = board_bytes(size)
+    return x_board.to_bytes(length, 'little') + o_board.to_bytes(length, 'little')
+
+
+def unpack(data, size=DEFAULT_SIZE):
+    length = board_bytes(size)
+    data = bytes(data)
+    return int.from_bytes(data[:length], 'little'), int.from_bytes(data[length:], 'little')
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+from collections import deque
+from django.conf import settings
+from . import protocol, sharding
+
+logger = logging.getLogger(__name__)
+
+
+def spectator_queue_size():
+    return getattr(settings, 'GAME_SPECTATOR_QUEUE', 32)
+
+
+def watch_group(game_code):
+    return f'watch-{game_code}'
+
+
+class Update:
+    """One move as spectators see it.
+
+    The move frames are the ones already built for the players; the snapshot
+    frame is only built if some spectator needs it, and then once per encoding.
+    """
+
+    __slots__ = ('frames', 'board', '_snapshots')
+
+    def __init__(self, frames, board):
+        self.frames = frames
+        # (x_board, o_board, size, win_length, move_count, result, state_hash)
+        self.board = board
+        self._snapshots = {}
+
+    def snapshot(self, encoding):
+        frame = self._snapshots.get(encoding)
+        if frame is None:
+            frame = self._snapshots[encoding] = protocol.encode_snapshot(encoding, *self.board)
+        return frame
+
+
+def board_of(state):
+    return (
+        state.x_board, state.o_board, state.board_size, state.win_length, state.move_count,
+        state.result, protocol.board_hash(state.x_board, state.o_board, state.board_size),
+    )
+
+
+class Subscriber:
+    """Bounded per-spectator backlog.
+
+    A spectator whose backlog fills up loses its queued moves and only gets
+    the newest board until it has caught up again.
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit or spectator_queue_size()
+        self.queue = deque()
+        self.latest = None
+        self.wake = asyncio.Event()
+        self.dropped = 0
+
+    def offer(self, update):
+        if self.latest is not None or len(self.queue) >= self.limit:
+            self.dropped += len(self.queue)
+            self.queue.clear()
+            self.latest = update
+        else:
+            self.queue.append(update)
+        self.wake.set()
+
+    async def next(self):
+        # Returns (is_snapshot, update).
+        while not self.queue and self.latest is None:
+            self.wake.clear()
+            await self.wake.wait()
+        if self.queue:
+            return False, self.queue.popleft()
+        update, self.latest = self.latest, None
+        return True, update
+
+
+class Feed:
+    """Spectators of one game on this process, fed by a task of their own."""
+
+    def __init__(self, game_code):
+        self.game_code = game_code
+        self.subscribers = set()
+        self.pending = deque()
+        self.wake = asyncio.Event()
+        self.task = asyncio.ensure_future(self.run())
+        self.relay = None
+
+    def publish(self, update):
+        self.pending.append(update)
+        self.wake.set()
+
+    async def run(self):
+        while True:
+            while not self.pending:
+                self.wake.clear()
+                await self.wake.wait()
+            update = self.pending.popleft()
+            for subscriber in tuple(self.subscribers):
+                subscriber.offer(update)
+
+    async def relay_from(self, channel_layer):
+        # Brings a game owned by another worker onto this one: one layer
+        # message per move however many spectators are watching here.
+        channel = await channel_layer.new_channel()
+        await channel_layer.group_add(watch_group(self.game_code), channel)
+        try:
+            while True:
+                message = await channel_layer.receive(channel)
+                self.publish(Update(message['frames'], tuple(message['board'])))
+        finally:
+            await channel_layer.group_discard(watch_group(self.game_code), channel)
+
+    def close(self):
+        self.task.cancel()
+        if self.relay is not None:
+            self.relay.cancel()
+
+
+class Broadcaster:
+    """Fans finished move frames out to spectators, away from the players' path.
+
+    Publishing costs the owner one append per move (plus one group message when
+    other workers may have spectators); per-spectator writes happen in the
+    game's feed task.
+    """
+
+    def __init__(self):
+        self.feeds = {}
+
+    def subscribe(self, channel_layer, game_code, subscriber):
+        feed = self.feeds.get(game_code)
+        if feed is None:
+            feed = self.feeds[game_code] = Feed(game_code)
+            if not sharding.is_local(game_code):
+                feed.relay = asyncio.ensure_future(feed.relay_from(channel_layer))
+        feed.subscribers.add(subscriber)
+
+    def unsubscribe(self, game_code, subscriber):
+        feed = self.feeds.get(game_code)
+        if feed is None:
+            return
+        feed.subscribers.discard(subscriber)
+        if not feed.subscribers:
+            del self.feeds[game_code]
+            feed.close()
+
+    def publish(self, channel_layer, game_code, frames, state):
+        feed = self.feeds.get(game_code)
+        sharded = sharding.shard_count() > 1
+        if feed is None and not sharded:
+            return
+        board = board_of(state)
+        if feed is not None:
+            feed.publish(Update(frames, board))
+        if sharded:
+            asyncio.ensure_future(self._relay(channel_layer, game_code, frames, board))
+
+    async def _relay(self, channel_layer, game_code, frames, board):
+        try:
+            await channel_layer.group_send(watch_group(game_code), {
+                'type': 'watch.update',
+                'frames': frames,
+                'board': board,
+            })
+        except Exception:
+            logger.exception('could not relay %s to spectators', game_code)
+
+
+broadcaster = Broadcaster()
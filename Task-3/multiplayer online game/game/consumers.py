@@ -1,9 +1,102 @@
 from channels.consumer import AsyncConsumer
-from .models import Game, GameMatrix
-from channels.db import database_sync_to_async
-from .helper import *
+from .models import GameMatrix
+from .db import game_sync_to_async
+from .engine import engine, check_move, player_symbol, InvalidMove
+from .bitboard import DEFAULT_SIZE, DEFAULT_WIN_LENGTH
+from .matchmaking import matchmaker
+from .lobby import join as join_lobby, cache as lobby_cache
+from .broadcast import broadcaster, board_of, Subscriber, Update
+from .resume import registry as resume_registry
+from .reaper import reaper
+from .throttle import TokenBucket, MOVE_TIMEOUT
+from .metrics import MOVES, REJECTED, MOVE_STAGES
+from .bitboard import PLAYER_X, PLAYER_O
+from . import ai, gauges, protocol, ratings, resume, sharding
 from channels.exceptions import StopConsumer
+import asyncio
 import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+async def play_move(channel_layer, game_code, game_matrix_id, position, player_type, player_name, vs_ai=False):
+    # Runs on the worker that owns game_code; raises InvalidMove before any
+    # write or group send if the engine refuses the move.
+    start = time.perf_counter()
+    result = await engine.move(game_code, game_matrix_id, position, player_type, player_name)
+    state = engine.get(game_code)
+
+    frames = protocol.encode_move(
+        position, player_type, player_name, result,
+        protocol.board_hash(state.x_board, state.o_board, state.board_size),
+    )
+    with MOVE_STAGES.time('group_send'):
+        await channel_layer.group_send_batch(game_code, [{
+            'type': 'game.move',
+            'frames': frames,
+            'position': position,
+            'symbol': player_symbol(player_type),
+            'result': result,
+        }])
+    broadcaster.publish(channel_layer, game_code, frames, state)
+    MOVES.inc()
+    MOVE_STAGES.observe(time.perf_counter() - start, 'total')
+    if(state.finished):
+        await rate_game(game_code, game_matrix_id, state)
+    if(vs_ai and player_type == 'null' and not state.finished):
+        asyncio.ensure_future(play_ai_move(channel_layer, game_code, game_matrix_id, state))
+    return result
+
+async def rate_game(game_code, game_matrix_id, state):
+    # Games against the AI aren't rated, nor anything while rating is switched off.
+    if(not ratings.rated()):
+        return
+    lobby = lobby_cache.get(game_code, game_matrix_id)
+    creator = state.names.get(PLAYER_X) or (lobby and lobby.creator)
+    opponent = state.names.get(PLAYER_O) or (lobby and lobby.opponent)
+    if(not creator or not opponent or ai.AI_NAME in (creator, opponent)):
+        return
+    try:
+        await ratings.record_result(creator, opponent, state.result)
+    except Exception:
+        logger.exception('could not rate game %s', game_code)
+
+async def play_ai_move(channel_layer, game_code, game_matrix_id, state):
+    # Replies after the human's frame has gone out, so the search never delays it.
+    move_count = state.move_count
+    position = await ai.choose_move(state.x_board, state.o_board, state.board_size, state.win_length)
+    if(position is None or engine.get(game_code) is not state or state.move_count != move_count or state.finished):
+        return
+    try:
+        await play_move(channel_layer, game_code, game_matrix_id, position, 'on', ai.AI_NAME)
+    except InvalidMove:
+        pass
+
+async def handle_shard_message(channel_layer, message):
+    # Moves and releases other workers forward for games this worker owns.
+    if(message['type'] == 'game.forward'):
+        try:
+            await play_move(
+                channel_layer, message['game_code'], message['game_matrix_id'],
+                message['position'], message['player_type'], message['player_name'],
+                message.get('vs_ai', False),
+            )
+        except InvalidMove:
+            REJECTED.inc('invalid')
+            # Let the sender take its next move instead of waiting out MOVE_TIMEOUT.
+            if(message.get('reply_channel')):
+                await channel_layer.send(message['reply_channel'], {
+                    'type': 'game.rejected',
+                })
+        except GameMatrix.DoesNotExist:
+            if(message.get('reply_channel')):
+                await channel_layer.send(message['reply_channel'], {
+                    'type': 'game.closed',
+                    'game_matrix_id': message['game_matrix_id'],
+                })
+    elif(message['type'] == 'game.release'):
+        await engine.discard(message['game_code'])
 
 class GameConsumer(AsyncConsumer):
     async def websocket_connect(self, event):
@@ -12,54 +105,285 @@ class GameConsumer(AsyncConsumer):
         self.game_matrix_id = self.scope['url_route']['kwargs']['game_matrix_id']
         self.player_name = self.scope['url_route']['kwargs']['player_name']
         self.player_type = self.scope['url_route']['kwargs']['player_type']
+        self.board_size = self.scope['url_route']['kwargs'].get('board_size')
+        self.win_length = self.scope['url_route']['kwargs'].get('win_length')
+        self.encoding, subprotocol = protocol.negotiate(self.scope)
+        self.joined = False
+        self.bucket = TokenBucket()
+        self.in_flight = None
+        # [x_board, o_board, board_size, result] as this socket last saw it, once known.
+        self.mirror = None
+        # Against the AI the human takes the creator's seat and the server plays O.
+        self.vs_ai = (self.player_type == ai.AI)
+        if(self.vs_ai):
+            self.player_type = 'null'
+        seen = resume.claim(self.scope, self.game_code, self.game_matrix_id, self.player_name, self.player_type)
 
-        game_object = await database_sync_to_async(Game.objects.filter)(game_code=self.game_code)
-        game_exists = await database_sync_to_async(game_object.exists)()
-        player_object = await database_sync_to_async(Game.objects.filter)(game_code=self.game_code, game_opponent='to-be-decided')
-        player_exists = await database_sync_to_async(player_object.exists)()
+        reaper.ensure_started()
+        local = sharding.is_local(self.game_code)
+        state = engine.get(self.game_code) if local else None
+        if(state is not None and str(state.matrix_id) != str(self.game_matrix_id)):
+            state = None
+        if(seen is not None):
+            await resume_registry.resume(self.channel_layer, self.game_code, self.player_type)
 
-        if(not game_exists or player_exists):
+        variant = (self.board_size, self.win_length) if self.board_size is not None else None
+        if(seen is not None and state is not None):
+            # The token proves the seat and the board is live here: no lobby round trip.
+            board_variant, joinable = (state.board_size, state.win_length), True
+        else:
+            lobby, joinable, boards = await join_lobby(
+                self.game_code, self.game_matrix_id, self.player_name, self.player_type,
+                variant=variant, need_boards=(local and state is None),
+                opponent=(ai.AI_NAME if self.vs_ai else None),
+            )
+            board_variant = (lobby.board_size, lobby.win_length)
+            if(local and state is None):
+                state = await engine.adopt(self.game_code, self.game_matrix_id, *boards, lobby.board_size, lobby.win_length)
+
+        # A client that names a variant must be playing the one the matrix was created with.
+        if(variant is not None and variant != board_variant):
+            await self.send({
+                'type':'websocket.close',
+            })
+            raise StopConsumer()
+
+        # Only a socket holding a seat plays moves or keeps the game alive when it drops.
+        if(joinable):
             await self.channel_layer.group_add(self.game_code, self.channel_name)
+            self.joined = True
+            gauges.connected('players')
 
-        self.game_id = await setup_game(self.game_code, self.game_matrix_id, self.player_name, self.player_type)
-        
         await self.send({
             'type':'websocket.accept',
+            'subprotocol':subprotocol,
         })
 
+        if(self.encoding != protocol.LEGACY):
+            if(state is None):
+                state = await engine.peek(self.game_code, self.game_matrix_id)
+            frames = resume.catch_up(state, seen, self.encoding) if seen is not None else []
+            frames.append(protocol.encode_resume(
+                self.encoding,
+                resume.issue_token(self.game_code, self.game_matrix_id, self.player_name, self.player_type),
+                state.move_count,
+            ))
+            for frame in frames:
+                await self.send_frame(frame)
+        # Only this worker's own boards are current; for another worker's game
+        # the state came from the database, up to a flush behind, and the owner
+        # validates the forwarded move instead.
+        if(local and state is not None):
+            self.mirror = [state.x_board, state.o_board, state.board_size, state.result]
+
     async def websocket_receive(self, event):
 
-        await update_matrix(self.game_matrix_id, event['text'], self.player_type)
-        self.result = await check_winner(self.game_matrix_id)
+        # Everything that can be refused here is refused before any DB or
+        # channel-layer work: junk, floods, a second move while the last one
+        # is unanswered (double clicks), and moves the board can't take.
+        if(not self.joined):
+            REJECTED.inc('unseated')
+            return
+        position = protocol.decode_position(event)
+        if(position is None):
+            REJECTED.inc('malformed')
+            return
+        if(not self.bucket.take()):
+            REJECTED.inc('throttled')
+            return
+        if(self.in_flight is not None and time.monotonic() - self.in_flight < MOVE_TIMEOUT):
+            REJECTED.inc('in_flight')
+            return
+        if(self.mirror is not None and check_move(*self.mirror, position, self.player_type) is not None):
+            REJECTED.inc('invalid')
+            return
 
-        if(self.result == 44):
-            await self.channel_layer.group_send(self.game_code, {
-                'type': 'send.message',
-                'message':json.dumps({"msg_type":"result", "msg":self.player_name})
+        if(sharding.is_local(self.game_code)):
+            try:
+                self.result = await play_move(self.channel_layer, self.game_code, self.game_matrix_id, position, self.player_type, self.player_name, self.vs_ai)
+            except InvalidMove:
+                REJECTED.inc('invalid')
+            except GameMatrix.DoesNotExist:
+                # Reaped between moves.
+                await self.close_gone()
+        else:
+            self.in_flight = time.monotonic()
+            await self.channel_layer.send(sharding.owner_channel(self.game_code), {
+                'type': 'game.forward',
+                'game_code': self.game_code,
+                'game_matrix_id': self.game_matrix_id,
+                'position': position,
+                'player_type': self.player_type,
+                'player_name': self.player_name,
+                'vs_ai': self.vs_ai,
+                'reply_channel': self.channel_name,
             })
-        elif(self.result == 11):
-            await self.channel_layer.group_send(self.game_code, {
-                'type': 'send.message',
-                'message':json.dumps({"msg_type":"result", "msg":self.player_name})
-            })
-        elif(self.result == False):
-            await self.channel_layer.group_send(self.game_code, {
-                'type': 'send.message',
-                'message':json.dumps({"msg_type":"result", "msg":"game drawn"})
+
+    async def send_frame(self, frame):
+        if(self.encoding == protocol.BINARY):
+            await self.send({
+                'type':'websocket.send',
+                'bytes':frame
             })
-        await self.channel_layer.group_send(self.game_code, {
-                'type': 'send.message',
-                'message': json.dumps({"msg_type":"chance", "position":event['text'], "symbol":self.player_type})
+        else:
+            await self.send({
+                'type':'websocket.send',
+                'text':frame
             })
 
+    async def game_move(self, event):
+        frames = event['frames']
+        if(self.mirror is not None):
+            self.mirror[0 if event['symbol'] == PLAYER_X else 1] |= 1 << (event['position'] - 1)
+            self.mirror[3] = event['result']
+        if(event['symbol'] == player_symbol(self.player_type)):
+            self.in_flight = None
+        if(self.encoding != protocol.LEGACY):
+            await self.send_frame(frames[self.encoding])
+        else:
+            for text in frames[protocol.LEGACY]:
+                await self.send({
+                    'type':'websocket.send',
+                    'text':text
+                })
+
+    async def game_rejected(self, event):
+        self.in_flight = None
+
+    async def game_closed(self, event):
+        # The matrix was deleted under the socket; a new game may already have its code.
+        if(str(event['game_matrix_id']) == str(self.game_matrix_id)):
+            await self.close_gone()
+
+    async def close_gone(self):
+        await self.send({
+            'type':'websocket.close',
+            'code':protocol.CLOSE_GAME_GONE,
+        })
+
     async def send_message(self, event):
         await self.send({
             'type':'websocket.send',
             'text':event['message']
         })
 
+    async def send_batch(self, event):
+        for message in event['messages']:
+            await self.dispatch(message)
+
+    async def websocket_disconnect(self, event):
+        # Keep the game for a grace period in case the player resumes; a
+        # socket that never got a seat leaves the game to the players.
+        if(getattr(self, 'joined', False)):
+            gauges.disconnected('players')
+            await self.channel_layer.group_discard(self.game_code, self.channel_name)
+            resume_registry.hold(self.channel_layer, self.game_code, self.player_type, self.close_game)
+        raise StopConsumer()
+
+    async def close_game(self):
+        if(sharding.is_local(self.game_code)):
+            await engine.discard(self.game_code)
+        else:
+            await self.channel_layer.send(sharding.owner_channel(self.game_code), {
+                'type': 'game.release',
+                'game_code': self.game_code,
+            })
+        lobby_cache.discard(self.game_code)
+        # The first player to leave has already removed it when the second one goes.
+        await game_sync_to_async(GameMatrix.objects.filter(id=self.game_matrix_id).delete)()
+
+
+class GameShardConsumer(AsyncConsumer):
+    # For `manage.py runworker game-shard-<id>` when an owner serves no sockets itself.
+    async def game_forward(self, event):
+        await handle_shard_message(self.channel_layer, event)
+
+    async def game_release(self, event):
+        await handle_shard_message(self.channel_layer, event)
+
+
+class SpectatorConsumer(AsyncConsumer):
+    # Watches a game through the broadcast tier; never joins the players' group.
+    async def websocket_connect(self, event):
+
+        self.game_code = self.scope['url_route']['kwargs']['game_code']
+        self.game_matrix_id = self.scope['url_route']['kwargs']['game_matrix_id']
+        self.encoding, subprotocol = protocol.negotiate(self.scope)
+        if(self.encoding == protocol.LEGACY):
+            self.encoding = protocol.JSON
+        self.subscriber = None
+
+        try:
+            state = await engine.peek(self.game_code, self.game_matrix_id)
+        except GameMatrix.DoesNotExist:
+            await self.send({
+                'type':'websocket.close',
+            })
+            raise StopConsumer()
+
+        await self.send({
+            'type':'websocket.accept',
+            'subprotocol':subprotocol,
+        })
+        # Start from the current board, then follow the move stream.
+        self.subscriber = Subscriber()
+        self.subscriber.latest = Update(None, board_of(state))
+        broadcaster.subscribe(self.channel_layer, self.game_code, self.subscriber)
+        gauges.connected('spectators')
+        self.writer = asyncio.ensure_future(self.write_updates())
+
+    async def write_updates(self):
+        while True:
+            snapshot, update = await self.subscriber.next()
+            frame = update.snapshot(self.encoding) if snapshot else update.frames[self.encoding]
+            if(self.encoding == protocol.BINARY):
+                await self.send({
+                    'type':'websocket.send',
+                    'bytes':frame
+                })
+            else:
+                await self.send({
+                    'type':'websocket.send',
+                    'text':frame
+                })
+
+    async def websocket_receive(self, event):
+        pass
+
+    async def websocket_disconnect(self, event):
+        if(self.subscriber is not None):
+            broadcaster.unsubscribe(self.game_code, self.subscriber)
+            self.writer.cancel()
+            gauges.disconnected('spectators')
+        raise StopConsumer()
+
+
+class MatchmakingConsumer(AsyncConsumer):
+    async def websocket_connect(self, event):
+
+        self.player_name = self.scope['url_route']['kwargs']['player_name']
+        board_size = self.scope['url_route']['kwargs'].get('board_size', DEFAULT_SIZE)
+        win_length = self.scope['url_route']['kwargs'].get('win_length', DEFAULT_WIN_LENGTH)
+
+        await self.send({
+            'type':'websocket.accept',
+        })
+        self.ticket = matchmaker.join(self.player_name, self.channel_name, board_size, win_length)
+
+    async def match_found(self, event):
+        await self.send({
+            'type':'websocket.send',
+            'text':json.dumps({
+                "msg_type":"match",
+                "game_code":event['game_code'],
+                "game_matrix_id":event['game_matrix_id'],
+                "player_type":event['player_type'],
+                "opponent":event['opponent'],
+                "board_size":event['board_size'],
+                "win_length":event['win_length'],
+            })
+        })
+
     async def websocket_disconnect(self, event):
-        
-        game_matrix = await database_sync_to_async(GameMatrix.objects.get)(id=self.game_matrix_id)
-        await database_sync_to_async(game_matrix.delete)()
+        matchmaker.leave(self.ticket)
         raise StopConsumer()
\ No newline at end of file
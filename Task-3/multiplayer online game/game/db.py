@@ -0,0 +1,27 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from channels.db import DatabaseSyncToAsync
+
+_executor = None
+
+
+def game_db_threads():
+    return getattr(settings, 'GAME_DB_THREADS', 4)
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=game_db_threads(), thread_name_prefix='game-db')
+    return _executor
+
+
+def game_sync_to_async(func):
+    """Run sync ORM work for the game on its own bounded pool.
+
+    All of the game's database access goes through here rather than Django's
+    async ORM methods (which run on the shared sync thread), so game traffic
+    never queues behind HTTP views. Connections are opened and closed per
+    call, as database_sync_to_async does.
+    """
+    return DatabaseSyncToAsync(func, thread_sensitive=False, executor=executor())
@@ -0,0 +1,232 @@
+import asyncio
+import time
+from django.db import transaction
+from django.utils import timezone
+from .db import game_sync_to_async
+from .models import GameMatrix
+from . import bitboard, history
+from .metrics import MOVE_STAGES
+from .bitboard import PLAYER_X, PLAYER_O, DRAW, ONGOING
+
+# Seconds to wait before writing a live board back to its GameMatrix row.
+FLUSH_DELAY = 1.0
+
+
+def player_symbol(player_type):
+    return PLAYER_X if player_type == 'null' else PLAYER_O
+
+
+class InvalidMove(Exception):
+    pass
+
+
+def check_move(x_board, o_board, board_size, result, box_id, player_type):
+    # Why box_id can't be played by player_type on this board, or None if it can.
+    if result is not ONGOING:
+        return 'game over'
+    if not 1 <= box_id <= board_size * board_size:
+        return 'off the board'
+    if (x_board | o_board) >> (box_id - 1) & 1:
+        return 'occupied'
+    x_to_move = bitboard.count_cells(x_board) == bitboard.count_cells(o_board)
+    if (player_symbol(player_type) == PLAYER_X) != x_to_move:
+        return 'out of turn'
+    return None
+
+
+class GameState:
+    __slots__ = (
+        'game_code', 'matrix_id', 'board_size', 'win_length',
+        'x_board', 'o_board', 'move_count', 'result', 'flush_task',
+        'log', 'snapshots', 'recorded', 'base', 'moves', 'names', 'touched',
+    )
+
+    def __init__(self, game_code, matrix_id, x_board=0, o_board=0,
+                 board_size=bitboard.DEFAULT_SIZE, win_length=bitboard.DEFAULT_WIN_LENGTH):
+        self.game_code = game_code
+        self.matrix_id = matrix_id
+        self.board_size = board_size
+        self.win_length = win_length
+        self.x_board = x_board
+        self.o_board = o_board
+        self.move_count = bitboard.count_cells(x_board | o_board)
+        self.flush_task = None
+        self.result = self.evaluate()
+        # Move log entries and snapshots not yet written to the GameRecord.
+        self.log = []
+        self.snapshots = []
+        self.recorded = False
+        # Every move made since this state was built, for clients catching up.
+        self.base = self.move_count
+        self.moves = []
+        self.names = {}
+        self.touched = time.monotonic()
+
+    @classmethod
+    def from_map(cls, game_code, matrix_id, matrix_map):
+        return cls(game_code, matrix_id, *bitboard.from_map(matrix_map))
+
+    def to_map(self):
+        return bitboard.to_map(self.x_board, self.o_board, self.board_size)
+
+    def evaluate(self):
+        return bitboard.winner(self.x_board, self.o_board, self.board_size, self.win_length)
+
+    def check(self, box_id, player_type):
+        return check_move(self.x_board, self.o_board, self.board_size, self.result, int(box_id), player_type)
+
+    def play(self, box_id, player_type):
+        reason = self.check(box_id, player_type)
+        if reason is not None:
+            raise InvalidMove(reason)
+        cell = int(box_id) - 1
+        bit = 1 << cell
+        symbol = player_symbol(player_type)
+        self.touched = time.monotonic()
+        if symbol == PLAYER_X:
+            self.x_board |= bit
+            board = self.x_board
+        else:
+            self.o_board |= bit
+            board = self.o_board
+        self.move_count += 1
+        self.log.append((self.move_count, cell, symbol))
+        self.moves.append((cell, symbol))
+        if self.move_count % history.SNAPSHOT_INTERVAL == 0:
+            self.snapshots.append((self.move_count, bitboard.pack(self.x_board, self.o_board, self.board_size)))
+        if bitboard.wins_through(board, cell, self.board_size, self.win_length):
+            self.result = symbol
+        elif self.move_count == self.board_size * self.board_size:
+            self.result = DRAW
+        return self.result
+
+    def moves_since(self, seen):
+        # (cell, symbol) for each move after the first `seen`, or None if they predate this state.
+        if seen < self.base or seen > self.move_count:
+            return None
+        return self.moves[seen - self.base:]
+
+    @property
+    def finished(self):
+        return self.result is not ONGOING
+
+
+class GameEngine:
+    """Authoritative per-process store of live boards, keyed by game code.
+
+    Moves and win checks are answered from memory; the GameMatrix row and
+    the game's move log are written back after FLUSH_DELAY, or straight away
+    once the game ends.
+    """
+
+    def __init__(self, flush_delay=FLUSH_DELAY):
+        self.flush_delay = flush_delay
+        self.games = {}
+        self._locks = {}
+
+    def __contains__(self, game_code):
+        return game_code in self.games
+
+    def get(self, game_code):
+        return self.games.get(game_code)
+
+    async def load(self, game_code, matrix_id):
+        state = self.games.get(game_code)
+        if state is not None:
+            if str(state.matrix_id) == str(matrix_id):
+                return state
+            # The code was reused for a new matrix; the old board is stale.
+            await self.discard(game_code)
+        lock = self._locks.setdefault(game_code, asyncio.Lock())
+        async with lock:
+            state = self.games.get(game_code)
+            if state is None:
+                state = await _read_state(game_code, matrix_id)
+                self.games[game_code] = state
+        return state
+
+    async def adopt(self, game_code, matrix_id, x_board, o_board, board_size, win_length):
+        # Take ownership of a board the caller already read, unless we hold a live one.
+        state = self.games.get(game_code)
+        if state is not None and str(state.matrix_id) == str(matrix_id):
+            return state
+        if state is not None:
+            await self.discard(game_code)
+        return self.games.setdefault(game_code, GameState(game_code, matrix_id, x_board, o_board, board_size, win_length))
+
+    async def peek(self, game_code, matrix_id):
+        # Current state without taking ownership, for workers that don't own the game.
+        state = self.games.get(game_code)
+        if state is not None and str(state.matrix_id) == str(matrix_id):
+            return state
+        return await _read_state(game_code, matrix_id)
+
+    async def move(self, game_code, matrix_id, box_id, player_type, player_name=None):
+        state = await self.load(game_code, matrix_id)
+        with MOVE_STAGES.time('winner_check'):
+            result = state.play(box_id, player_type)
+        if player_name is not None:
+            state.names[player_symbol(player_type)] = player_name
+        if state.finished:
+            await self.flush(game_code)
+        elif state.flush_task is None:
+            state.flush_task = asyncio.ensure_future(self._delayed_flush(state))
+        return result
+
+    async def flush(self, game_code):
+        state = self.games.get(game_code)
+        if state is not None:
+            await self._write(state)
+
+    async def _write(self, state):
+        if state.flush_task is not None and state.flush_task is not asyncio.current_task():
+            state.flush_task.cancel()
+        state.flush_task = None
+        log, snapshots = state.log, state.snapshots
+        state.log, state.snapshots = [], []
+        try:
+            with MOVE_STAGES.time('db_update'):
+                await _write_state(
+                    state.game_code, state.matrix_id, state.board_size, state.win_length,
+                    bitboard.pack(state.x_board, state.o_board, state.board_size),
+                    log, snapshots, state.result, not state.recorded,
+                )
+        except Exception:
+            # Keep the entries for the next flush rather than leaving a gap in the log.
+            state.log[:0] = log
+            state.snapshots[:0] = snapshots
+            raise
+        if log or snapshots or state.finished:
+            state.recorded = True
+
+    async def _delayed_flush(self, state):
+        await asyncio.sleep(self.flush_delay)
+        if self.games.get(state.game_code) is state:
+            await self.flush(state.game_code)
+
+    async def discard(self, game_code):
+        # Out of the store first so no later move lands on it, then whatever
+        # it still buffers is written rather than dropped with it.
+        state = self.games.pop(game_code, None)
+        self._locks.pop(game_code, None)
+        if state is not None and (state.flush_task is not None or state.log or state.snapshots):
+            await self._write(state)
+        return state
+
+
+@game_sync_to_async
+def _read_state(game_code, matrix_id):
+    game_matrix = GameMatrix.objects.get(id=matrix_id)
+    x_board, o_board = game_matrix.get_boards()
+    return GameState(game_code, matrix_id, x_board, o_board, game_matrix.board_size, game_matrix.win_length)
+
+@game_sync_to_async
+def _write_state(game_code, matrix_id, board_size, win_length, board, log, snapshots, result, ensure):
+    # The packed board is the live copy; the log is what outlives the matrix.
+    with transaction.atomic():
+        GameMatrix.objects.filter(id=matrix_id).update(board=board, updated=timezone.now())
+        if log or snapshots or result is not ONGOING:
+            history.append(game_code, matrix_id, board_size, win_length, log, snapshots, result, ensure=ensure)
+
+
+engine = GameEngine()
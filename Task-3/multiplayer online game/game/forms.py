@@ -1,4 +1,5 @@
 from django import forms
+from .bitboard import DEFAULT_SIZE, DEFAULT_WIN_LENGTH
 
 class PlayerForm(forms.Form):
     player_name = forms.CharField(
@@ -12,8 +13,48 @@ class PlayerForm(forms.Form):
         required=False
     )
     
+    play_computer = forms.BooleanField(
+        label='Play against the computer',
+        widget=forms.widgets.CheckboxInput(attrs={'class': 'form-check-input'}),
+        required=False
+    )
+
     game_code = forms.CharField(
         label='Game Code',
         max_length=6,
         widget=forms.TextInput(attrs={'class':'form-control'})
-    )
\ No newline at end of file
+    )
+
+    board_size = forms.IntegerField(
+        label='Board size',
+        min_value=3,
+        max_value=19,
+        initial=DEFAULT_SIZE,
+        required=False,
+        widget=forms.NumberInput(attrs={'class':'form-control'})
+    )
+
+    win_length = forms.IntegerField(
+        label='In a row to win',
+        min_value=3,
+        max_value=19,
+        initial=DEFAULT_WIN_LENGTH,
+        required=False,
+        widget=forms.NumberInput(attrs={'class':'form-control'})
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        board_size = cleaned_data.get('board_size') or DEFAULT_SIZE
+        win_length = cleaned_data.get('win_length') or DEFAULT_WIN_LENGTH
+        if win_length > board_size:
+            raise forms.ValidationError('In a row to win cannot be longer than the board.')
+        cleaned_data['board_size'] = board_size
+        cleaned_data['win_length'] = win_length
+        return cleaned_data
+
+    def get_variant(self):
+        # Anything the form can't validate falls back to the classic 3x3 game.
+        if self.is_valid():
+            return self.cleaned_data['board_size'], self.cleaned_data['win_length']
+        return DEFAULT_SIZE, DEFAULT_WIN_LENGTH
\ No newline at end of file
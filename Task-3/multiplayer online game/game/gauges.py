@@ -0,0 +1,41 @@
+import sys
+
+# Process-wide counts the consumers keep up to date.
+sockets = {'players': 0, 'spectators': 0}
+
+
+def connected(kind):
+    sockets[kind] += 1
+
+
+def disconnected(kind):
+    sockets[kind] -= 1
+
+
+def state_bytes(state):
+    # Rough footprint of one live game: the state and the lists it grows.
+    size = sys.getsizeof(state) + sys.getsizeof(state.x_board) + sys.getsizeof(state.o_board)
+    for entries in (state.log, state.snapshots, state.moves):
+        size += sys.getsizeof(entries) + sum(sys.getsizeof(entry) for entry in entries)
+    return size
+
+
+def snapshot():
+    """Current gauge values for this worker."""
+    from .broadcast import broadcaster
+    from .engine import engine
+    from .lobby import cache
+    from .resume import registry
+
+    games = list(engine.games.values())
+    total = sum(state_bytes(state) for state in games)
+    return {
+        'live_games': len(games),
+        'player_sockets': sockets['players'],
+        'spectator_sockets': sockets['spectators'],
+        'spectated_games': len(broadcaster.feeds),
+        'held_seats': len(registry.pending),
+        'cached_lobbies': len(cache.entries),
+        'game_bytes': total,
+        'bytes_per_game': total // len(games) if games else 0,
+    }
@@ -0,0 +1,83 @@
+from collections import namedtuple
+from django.db import transaction
+from django.utils import timezone
+from . import bitboard
+from .bitboard import PLAYER_X, ONGOING
+from .models import Game, GameRecord, GameMove, GameSnapshot
+from .protocol import outcome_code
+
+# A packed board is kept every this many moves, so a replay never applies more
+# than SNAPSHOT_INTERVAL - 1 moves on top of the snapshot it starts from.
+SNAPSHOT_INTERVAL = 16
+
+Replay = namedtuple('Replay', 'game_code board_size win_length x_board o_board move_count result')
+
+
+def open_record(game_code, game_matrix_id, creator, opponent=None, board_size=bitboard.DEFAULT_SIZE,
+                win_length=bitboard.DEFAULT_WIN_LENGTH):
+    defaults = {'game_code': game_code, 'game_creator': creator, 'board_size': board_size, 'win_length': win_length}
+    if opponent is not None:
+        defaults['game_opponent'] = opponent
+    return GameRecord.objects.get_or_create(game_matrix_id=game_matrix_id, defaults=defaults)[0]
+
+
+def append(game_code, game_matrix_id, board_size, win_length, moves, snapshots, result=ONGOING, ensure=True):
+    """Append (seq, cell, symbol) moves and (seq, packed board) snapshots to a game's log.
+
+    Rows are only ever inserted; a seq that is already logged is left alone.
+    """
+    with transaction.atomic():
+        if ensure:
+            # Games created before the log existed, or outside the lobby.
+            game = Game.objects.filter(game_matrix_id=game_matrix_id).order_by('-id').first()
+            open_record(
+                game_code, game_matrix_id,
+                game.game_creator if game else '', game.game_opponent if game else None,
+                board_size, win_length,
+            )
+        GameMove.objects.bulk_create([
+            GameMove(record_id=game_matrix_id, seq=seq, cell=cell, symbol=symbol)
+            for seq, cell, symbol in moves
+        ], ignore_conflicts=True)
+        GameSnapshot.objects.bulk_create([
+            GameSnapshot(record_id=game_matrix_id, seq=seq, board=board)
+            for seq, board in snapshots
+        ], ignore_conflicts=True)
+        if result is not ONGOING:
+            GameRecord.objects.filter(game_matrix_id=game_matrix_id).update(
+                result=outcome_code(result), finished=timezone.now(),
+            )
+
+
+def replay(game_matrix_id, upto=None):
+    """Rebuild a logged game as it stood after move `upto` (default: the last one).
+
+    Starts from the nearest snapshot at or before `upto`, so the cost is the
+    moves played since then rather than the whole game.
+    """
+    record = GameRecord.objects.get(game_matrix_id=game_matrix_id)
+    snapshots = record.snapshots.order_by('-seq')
+    moves = record.moves.order_by('seq')
+    if upto is not None:
+        snapshots = snapshots.filter(seq__lte=upto)
+        moves = moves.filter(seq__lte=upto)
+
+    x_board = o_board = 0
+    move_count = 0
+    snapshot = snapshots.values_list('seq', 'board').first()
+    if snapshot is not None:
+        move_count = snapshot[0]
+        x_board, o_board = bitboard.unpack(bytes(snapshot[1]), record.board_size)
+        moves = moves.filter(seq__gt=move_count)
+
+    for seq, cell, symbol in moves.values_list('seq', 'cell', 'symbol'):
+        if symbol == PLAYER_X:
+            x_board |= 1 << cell
+        else:
+            o_board |= 1 << cell
+        move_count = seq
+
+    return Replay(
+        record.game_code, record.board_size, record.win_length, x_board, o_board, move_count,
+        bitboard.winner(x_board, o_board, record.board_size, record.win_length),
+    )
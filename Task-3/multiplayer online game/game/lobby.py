@@ -0,0 +1,112 @@
+import time
+from collections import namedtuple
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from .db import game_sync_to_async
+from .models import Game, GameMatrix
+
+OPEN_SEAT = 'to-be-decided'
+
+# creator is None while no Game row exists for the code yet.
+Lobby = namedtuple('Lobby', 'game_code game_matrix_id board_size win_length creator opponent')
+
+
+def lobby_ttl():
+    return getattr(settings, 'GAME_LOBBY_CACHE_TTL', 5.0)
+
+
+def can_join(lobby, player_name):
+    # New game, open seat, or a seat already booked under this name.
+    return (
+        lobby.creator is None
+        or lobby.opponent == OPEN_SEAT
+        or player_name in (lobby.creator, lobby.opponent)
+    )
+
+
+def needs_seat_write(lobby, player_type):
+    if player_type == 'null':
+        return lobby.creator is None
+    return lobby.creator is not None and lobby.opponent == OPEN_SEAT
+
+
+class LobbyCache:
+    """Short-lived per-process copy of who sits where, keyed by game code.
+
+    Lets reconnect storms skip the database when nothing needs writing.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, game_code, game_matrix_id):
+        entry = self.entries.get(game_code)
+        if entry is None:
+            return None
+        expires, lobby = entry
+        if expires < time.monotonic() or str(lobby.game_matrix_id) != str(game_matrix_id):
+            del self.entries[game_code]
+            return None
+        return lobby
+
+    def put(self, lobby):
+        ttl = lobby_ttl()
+        if ttl > 0:
+            self.entries[lobby.game_code] = (time.monotonic() + ttl, lobby)
+
+    def discard(self, game_code):
+        self.entries.pop(game_code, None)
+
+    def prune(self):
+        now = time.monotonic()
+        for game_code in [code for code, (expires, _) in self.entries.items() if expires < now]:
+            del self.entries[game_code]
+
+
+cache = LobbyCache()
+
+
+@game_sync_to_async
+def _join(game_code, game_matrix_id, player_name, player_type, variant, opponent):
+    # One executor hop: the matrix and the code's seats come back in a single
+    # SELECT, then the player's seat is claimed if it isn't theirs already.
+    latest_game = Game.objects.filter(game_code=game_code).order_by('-id')
+    row = GameMatrix.objects.filter(id=game_matrix_id).annotate(
+        creator=Subquery(latest_game.values('game_creator')[:1]),
+        opponent=Subquery(latest_game.values('game_opponent')[:1]),
+    ).first()
+    if row is None:
+        raise GameMatrix.DoesNotExist(game_matrix_id)
+
+    lobby = Lobby(game_code, row.id, row.board_size, row.win_length, row.creator, row.opponent)
+    if variant is not None and variant != (row.board_size, row.win_length):
+        # The caller will refuse this client; don't give it a seat.
+        return lobby, row.get_boards()
+    if needs_seat_write(lobby, player_type):
+        if player_type == 'null':
+            opponent = opponent or OPEN_SEAT
+            Game.objects.create(game_code=game_code, game_creator=player_name, game_opponent=opponent, game_matrix_id=row.id)
+            lobby = lobby._replace(creator=player_name, opponent=opponent)
+        else:
+            seated = Game.objects.filter(game_code=game_code, game_matrix_id=row.id, game_opponent=OPEN_SEAT).update(game_opponent=player_name)
+            if seated:
+                lobby = lobby._replace(opponent=player_name)
+            else:
+                # Someone else took the seat since the SELECT; whoever holds it wins.
+                lobby = lobby._replace(opponent=latest_game.values_list('game_opponent', flat=True).first())
+    return lobby, row.get_boards()
+
+
+async def join(game_code, game_matrix_id, player_name, player_type, variant=None, need_boards=True, opponent=None):
+    """Resolve a connecting player's lobby and seat.
+
+    A creator may bring its own opponent (the AI); otherwise the seat opens.
+    Returns (lobby, joinable, boards); boards is None when the cache answered.
+    """
+    lobby = cache.get(game_code, game_matrix_id)
+    if lobby is not None and not need_boards and not needs_seat_write(lobby, player_type):
+        return lobby, can_join(lobby, player_name), None
+
+    lobby, boards = await _join(game_code, game_matrix_id, player_name, player_type, variant, opponent)
+    cache.put(lobby)
+    return lobby, can_join(lobby, player_name), boards
@@ -0,0 +1,31 @@
+import asyncio
+from django.core.management.base import BaseCommand, CommandError
+from game.analysis import BLUNDER, analyzer
+from game.models import GameRecord
+
+
+class Command(BaseCommand):
+    help = 'Review finished games move by move: the best move in each position and any blunders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('game_matrix_ids', nargs='+', type=int)
+
+    def handle(self, *args, **options):
+        try:
+            results = asyncio.run(self.analyse(options['game_matrix_ids']))
+        except GameRecord.DoesNotExist:
+            raise CommandError('No record for one of those games.')
+        except ValueError as error:
+            raise CommandError(str(error))
+        for game_matrix_id, reviews in zip(options['game_matrix_ids'], results):
+            self.stdout.write(f'game {game_matrix_id}:')
+            for review in reviews:
+                marker = '  ??' if review.verdict == BLUNDER else ''
+                self.stdout.write(
+                    f'  {review.seq:>3}. {review.box_id:>3}  best {review.best_box_id or "-":>3}  '
+                    f'{review.verdict:<10} ({review.value} / {review.best_value}){marker}'
+                )
+        self.stdout.write(f'position cache: {analyzer.cache.hits} hits, {analyzer.cache.misses} misses')
+
+    async def analyse(self, game_matrix_ids):
+        return await asyncio.gather(*(analyzer.submit(game_matrix_id) for game_matrix_id in game_matrix_ids))
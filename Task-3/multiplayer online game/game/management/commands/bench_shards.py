@@ -0,0 +1,151 @@
+import asyncio
+import multiprocessing
+import random
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from game import sharding
+from game.bitboard import ONGOING
+from game.scratchdb import scratch_database, use_database
+
+
+def run_shard(shard, shards, database, ready):
+    # One owner worker: the same listener and handler a sharded server runs,
+    # serving game.forward messages for the codes the ring gives this shard.
+    import django
+    django.setup()
+    from game.consumers import handle_shard_message
+
+    use_database(database)
+    settings.GAME_SHARDS = shards
+    settings.GAME_SHARD_ID = shard
+    sharding.ring = sharding.HashRing(range(shards))
+
+    async def serve():
+        layer = get_channel_layer()
+        ready.set()
+        await sharding.listener.run(layer, handle_shard_message)
+
+    asyncio.run(serve())
+
+
+async def receive_reply(layer, channel):
+    # The owner answers with the game's group message, or game.rejected.
+    message = await layer.receive(channel)
+    messages = message['messages'] if message['type'] == 'send.batch' else [message]
+    for message in messages:
+        if message['type'] == 'game.move':
+            return message
+    return None
+
+
+async def play_forwarded(layer, game_matrix, cells, timeout):
+    # A non-owner worker's view of one game: every move is forwarded to the
+    # owner and counts once its group message comes back.
+    channel = await layer.new_channel()
+    await layer.group_add(game_matrix.game_code, channel)
+    moves = 0
+    try:
+        for position in cells:
+            player_type = 'null' if moves % 2 == 0 else 'on'
+            await layer.send(sharding.owner_channel(game_matrix.game_code), {
+                'type': 'game.forward',
+                'game_code': game_matrix.game_code,
+                'game_matrix_id': game_matrix.id,
+                'position': position,
+                'player_type': player_type,
+                'player_name': f'bench-{player_type}',
+                'vs_ai': False,
+                'reply_channel': channel,
+            })
+            reply = await asyncio.wait_for(receive_reply(layer, channel), timeout)
+            if reply is None:
+                continue
+            moves += 1
+            if reply['result'] is not ONGOING:
+                break
+    finally:
+        await layer.group_discard(game_matrix.game_code, channel)
+    return moves
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure move throughput through the sharded path: moves are forwarded over the '
+        'channel layer to the owning shard worker, which plays them and answers the group. '
+        'Runs against a throwaway database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=2000)
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+        parser.add_argument('--board-size', type=int, default=15)
+        parser.add_argument('--win-length', type=int, default=5)
+        parser.add_argument('--concurrency', type=int, default=200)
+        parser.add_argument('--timeout', type=float, default=10.0)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if isinstance(get_channel_layer(), InMemoryChannelLayer):
+            raise CommandError('Shards talk over the channel layer; run this with GAME_CHANNEL_LAYER=redis.')
+        self.options = options
+
+        with scratch_database() as database:
+            baseline = None
+            for workers in options['workers']:
+                moves, elapsed, split = self.bench(workers, database)
+                throughput = moves / elapsed
+                baseline = baseline or throughput
+                self.stdout.write(
+                    f'workers={workers:<3} games={split:<24} moves={moves:<9} '
+                    f'{throughput:>10.0f} moves/s  {throughput / baseline:.2f}x'
+                )
+
+    def bench(self, workers, database):
+        # Not at the top: shard workers import this module before django.setup().
+        from game.matchmaking import codes
+
+        options = self.options
+        matrices = codes.create_matrices(options['games'], board_size=options['board_size'], win_length=options['win_length'])
+        # This process plays the non-owner side, routing with the same ring as the shards.
+        settings.GAME_SHARDS = workers
+        sharding.ring = sharding.HashRing(range(workers))
+        split = '/'.join(
+            str(sum(sharding.owner(matrix.game_code) == shard for matrix in matrices)) for shard in range(workers)
+        )
+
+        # spawn, not fork: each shard gets its own event loop and layer connections.
+        context = multiprocessing.get_context('spawn')
+        ready = [context.Event() for _ in range(workers)]
+        processes = [
+            context.Process(target=run_shard, args=(shard, workers, database, ready[shard]), daemon=True)
+            for shard in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for event in ready:
+                if not event.wait(60):
+                    raise CommandError('a shard worker did not start')
+            return asyncio.run(self.drive(matrices)) + (split,)
+        finally:
+            for process in processes:
+                process.terminate()
+                process.join()
+
+    async def drive(self, matrices):
+        options = self.options
+        layer = get_channel_layer()
+        rng = random.Random(options['seed'])
+        cells = list(range(1, options['board_size'] ** 2 + 1))
+        limit = asyncio.Semaphore(options['concurrency'])
+
+        async def bounded(game_matrix, order):
+            async with limit:
+                return await play_forwarded(layer, game_matrix, order, options['timeout'])
+
+        orders = [rng.sample(cells, len(cells)) for _ in matrices]
+        start = time.perf_counter()
+        moves = await asyncio.gather(*(bounded(matrix, order) for matrix, order in zip(matrices, orders)))
+        return sum(moves), time.perf_counter() - start
@@ -0,0 +1,72 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from game.bitboard import PLAYER_X, PLAYER_O, winner, from_map
+
+
+def legacy_check_winner(gm_map):
+    # The if-chain check_winner used before the bitboard rewrite, minus the DB read.
+    base_map = [1, 2, 3, 4, 5, 6, 7, 8, 9]
+
+    if( (gm_map[0] == gm_map[1] == gm_map[2] == 11) or (gm_map[3] == gm_map[4] == gm_map[5] == 11) or (gm_map[6] == gm_map[7] == gm_map[8] == 11) ):
+        return 11
+    elif( (gm_map[0] == gm_map[1] == gm_map[2] == 44) or (gm_map[3] == gm_map[4] == gm_map[5] == 44) or (gm_map[6] == gm_map[7] == gm_map[8] == 44) ):
+        return 44
+    elif( (gm_map[0] == gm_map[3] == gm_map[6] == 11) or (gm_map[1] == gm_map[4] == gm_map[7] == 11) or (gm_map[2] == gm_map[5] == gm_map[8] == 11) ):
+        return 11
+    elif( (gm_map[0] == gm_map[3] == gm_map[6] == 44) or (gm_map[1] == gm_map[4] == gm_map[7] == 44) or (gm_map[2] == gm_map[5] == gm_map[8] == 44) ):
+        return 44
+    elif( (gm_map[0] == gm_map[4] == gm_map[8] == 11) or (gm_map[2] == gm_map[4] == gm_map[6] == 11) ):
+        return 11
+    elif( (gm_map[0] == gm_map[4] == gm_map[8] == 44) or (gm_map[2] == gm_map[4] == gm_map[6] == 44) ):
+        return 44
+    else:
+        return any(element in gm_map for element in base_map)
+
+
+def random_position(rng):
+    # Alternate X and O over a random prefix of a shuffled board, like a real game.
+    cells = list(range(9))
+    rng.shuffle(cells)
+    gm_map = list(range(1, 10))
+    for turn, cell in enumerate(cells[:rng.randint(0, 9)]):
+        gm_map[cell] = PLAYER_X if turn % 2 == 0 else PLAYER_O
+    return gm_map
+
+
+class Command(BaseCommand):
+    help = 'Compare the legacy check_winner if-chain with bitboard win detection.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--positions', type=int, default=1000000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        maps = [random_position(rng) for _ in range(options['positions'])]
+        boards = [from_map(gm_map) for gm_map in maps]
+
+        start = time.perf_counter()
+        expected = [legacy_check_winner(gm_map) for gm_map in maps]
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = [winner(x_board, o_board) for x_board, o_board in boards]
+        bitboard_time = time.perf_counter() - start
+
+        # Positions where both players hold a line can't occur in play and
+        # the two checks break the tie differently, so only compare the rest.
+        mismatches = sum(
+            1 for old, new, (x_board, o_board) in zip(expected, results, boards)
+            if old != new and not (winner(x_board, 0) == PLAYER_X and winner(0, o_board) == PLAYER_O)
+        )
+
+        count = len(maps)
+        self.stdout.write(f'positions:  {count}')
+        self.stdout.write(f'legacy:     {legacy_time:.3f}s ({legacy_time / count * 1e9:.0f} ns/check)')
+        self.stdout.write(f'bitboard:   {bitboard_time:.3f}s ({bitboard_time / count * 1e9:.0f} ns/check)')
+        self.stdout.write(f'speedup:    {legacy_time / bitboard_time:.2f}x')
+        if mismatches:
+            self.stderr.write(f'{mismatches} positions disagree')
+        else:
+            self.stdout.write(self.style.SUCCESS('results match'))
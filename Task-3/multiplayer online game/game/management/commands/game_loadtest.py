@@ -0,0 +1,137 @@
+import asyncio
+import random
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from channels.testing import WebsocketCommunicator
+from game import protocol
+from game.matchmaking import codes
+from game.scratchdb import scratch_database
+
+SUBPROTOCOL = {
+    protocol.JSON: 'ttt.v1.json',
+    protocol.BINARY: 'ttt.v1.bin',
+}
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class LoadStats:
+    def __init__(self):
+        self.connect = []
+        self.move = []
+        self.frames = 0
+        self.games = 0
+        self.errors = 0
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive simulated player pairs through the game websocket and report latency percentiles. '
+        'Runs against a throwaway database, with rating switched off.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pairs', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=100)
+        parser.add_argument('--board-size', type=int, default=3)
+        parser.add_argument('--win-length', type=int, default=3)
+        parser.add_argument('--encoding', choices=[protocol.JSON, protocol.BINARY], default=protocol.JSON)
+        parser.add_argument('--timeout', type=float, default=5.0)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['win_length'] > options['board_size']:
+            raise CommandError('--win-length cannot be longer than --board-size.')
+        from tic_tac_toe.asgi import application
+        self.application = application
+        self.options = options
+        self.rng = random.Random(options['seed'])
+
+        stats = LoadStats()
+        # Simulated players move as fast as the server answers; measure the
+        # server rather than the per-connection move throttle. Their games,
+        # records and players never reach the configured database or the
+        # leaderboard.
+        with scratch_database(), override_settings(GAME_MOVE_RATE=0, GAME_RATED=False):
+            # The creators' POSTs (views.game) happen up front, outside the timed run.
+            matrices = codes.create_matrices(options['pairs'], board_size=options['board_size'], win_length=options['win_length'])
+            start = time.perf_counter()
+            asyncio.run(self.run(matrices, stats))
+            elapsed = time.perf_counter() - start
+        self.report(stats, elapsed)
+
+    async def run(self, matrices, stats):
+        limit = asyncio.Semaphore(self.options['concurrency'])
+
+        async def bounded(index, game_matrix):
+            async with limit:
+                try:
+                    await self.play_pair(index, game_matrix, stats)
+                except Exception as error:
+                    # One failed pair is an error in the report, not the end of the run.
+                    stats.errors += 1
+                    if not isinstance(error, (asyncio.TimeoutError, AssertionError)):
+                        self.stderr.write(f'pair {index}: {error!r}')
+
+        await asyncio.gather(*(bounded(index, game_matrix) for index, game_matrix in enumerate(matrices)))
+
+    async def connect(self, path, stats):
+        communicator = WebsocketCommunicator(self.application, path, subprotocols=[SUBPROTOCOL[self.options['encoding']]])
+        start = time.perf_counter()
+        connected, _ = await communicator.connect(timeout=self.options['timeout'])
+        assert connected
+        # Versioned clients are handed a resume token straight after the accept.
+        message = await communicator.receive_output(timeout=self.options['timeout'])
+        assert protocol.is_resume(message.get('bytes') or message.get('text'))
+        stats.connect.append(time.perf_counter() - start)
+        return communicator
+
+    async def receive_frame(self, communicator):
+        message = await communicator.receive_output(timeout=self.options['timeout'])
+        assert message['type'] == 'websocket.send'
+        return protocol.decode_move(message.get('bytes') or message.get('text'))
+
+    async def play_pair(self, index, game_matrix, stats):
+        board_size, win_length = self.options['board_size'], self.options['win_length']
+        base = f'/ws/asc/pg/{game_matrix.game_code}/{game_matrix.id}'
+        creator = await self.connect(f'{base}/creator{index}/null/{board_size}/{win_length}/', stats)
+        opponent = await self.connect(f'{base}/opponent{index}/on/{board_size}/{win_length}/', stats)
+
+        cells = list(range(1, board_size * board_size + 1))
+        self.rng.shuffle(cells)
+        try:
+            for turn, position in enumerate(cells):
+                mover, other = (creator, opponent) if turn % 2 == 0 else (opponent, creator)
+                start = time.perf_counter()
+                await mover.send_to(text_data=str(position))
+                frame = await self.receive_frame(mover)
+                stats.move.append(time.perf_counter() - start)
+                await self.receive_frame(other)
+                stats.frames += 2
+                if frame['o'] != protocol.OUTCOME_ONGOING:
+                    break
+            stats.games += 1
+        finally:
+            await creator.disconnect()
+            await opponent.disconnect()
+
+    def report(self, stats, elapsed):
+        def line(label, samples):
+            self.stdout.write(
+                f'{label:<8} n={len(samples):<8} '
+                f'p50={percentile(samples, 0.50) * 1000:8.2f}ms '
+                f'p95={percentile(samples, 0.95) * 1000:8.2f}ms '
+                f'p99={percentile(samples, 0.99) * 1000:8.2f}ms'
+            )
+
+        self.stdout.write(f'pairs:    {self.options["pairs"]} ({stats.games} games finished, {stats.errors} errors) in {elapsed:.2f}s')
+        line('connect', stats.connect)
+        line('move', stats.move)
+        self.stdout.write(f'messages: {stats.frames / elapsed:.0f}/s received, {len(stats.move) / elapsed:.0f} moves/s')
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from game.reaper import reap_database
+
+
+class Command(BaseCommand):
+    help = 'Delete lobbies nobody joined and games idle past GAME_IDLE_TTL (for cron, alongside the in-process reaper).'
+
+    def handle(self, *args, **options):
+        lobbies, games = reap_database()
+        self.stdout.write(f'reaped {lobbies} lobbies and {games} idle games')
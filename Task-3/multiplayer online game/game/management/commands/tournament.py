@@ -0,0 +1,63 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from game import tournaments
+from game.models import Tournament
+
+
+class Command(BaseCommand):
+    help = 'Create a swiss or knockout tournament, or advance one to its next round (safe to run from cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['create', 'advance', 'show'])
+        parser.add_argument('--id', type=int, help='Tournament to advance or show.')
+        parser.add_argument('--name', default='Tournament')
+        parser.add_argument('--format', choices=[Tournament.SWISS, Tournament.KNOCKOUT], default=Tournament.SWISS)
+        parser.add_argument('--players', nargs='+', default=[])
+        parser.add_argument('--rounds', type=int, help='Swiss rounds; defaults to log2 of the field.')
+        parser.add_argument('--board-size', type=int, default=3)
+        parser.add_argument('--win-length', type=int, default=3)
+
+    def handle(self, *args, **options):
+        if options['action'] == 'create':
+            return self.create(options)
+        if options['id'] is None:
+            raise CommandError('--id is required to advance or show a tournament.')
+        try:
+            tournament = Tournament.objects.get(pk=options['id'])
+        except Tournament.DoesNotExist:
+            raise CommandError(f'No tournament {options["id"]}.')
+        if options['action'] == 'advance':
+            if tournaments.advance(tournament.pk):
+                tournament.refresh_from_db()
+                self.stdout.write(f'{tournament.name}: round {tournament.current_round}, {tournament.status}')
+            else:
+                self.stdout.write(f'{tournament.name}: round {tournament.current_round} is still being played')
+        self.show(tournament)
+
+    def create(self, options):
+        if options['win_length'] > options['board_size']:
+            raise CommandError('--win-length cannot be longer than --board-size.')
+        try:
+            tournament = tournaments.create_tournament(
+                options['name'], options['players'], options['format'],
+                options['board_size'], options['win_length'], options['rounds'],
+            )
+        except ValueError as error:
+            raise CommandError(str(error))
+        start = time.perf_counter()
+        matches = tournaments.start_round(tournament.pk)
+        self.stdout.write(
+            f'created tournament {tournament.pk} and started round 1: '
+            f'{len(matches)} pairings in {(time.perf_counter() - start) * 1000:.1f} ms'
+        )
+        self.show(tournament)
+
+    def show(self, tournament):
+        tournament.refresh_from_db()
+        for match in tournament.matches.filter(round=tournament.current_round):
+            if match.opponent:
+                self.stdout.write(f'  {match.game_code}  {match.creator} (X) vs {match.opponent} (O)  result={match.result}')
+            else:
+                self.stdout.write(f'  bye    {match.creator}')
+        for row in tournaments.standings(tournament):
+            self.stdout.write(f'{row["seed"]:>4}  {row["player"]:<20} {row["score"]:>4}{"  out" if row["eliminated"] else ""}')
@@ -0,0 +1,191 @@
+import asyncio
+import itertools
+import logging
+import math
+import random
+import threading
+from collections import OrderedDict
+from django.db import IntegrityError, transaction
+from channels.layers import get_channel_layer
+from .db import game_sync_to_async
+from .bitboard import DEFAULT_SIZE, DEFAULT_WIN_LENGTH
+from .models import Game, GameMatrix
+
+logger = logging.getLogger(__name__)
+
+CODE_MIN = 111111
+CODE_MAX = 999999
+# Fresh codes to try when another process inserts ours first.
+CODE_ATTEMPTS = 5
+
+
+class GameCodeAllocator:
+    """Hands out 6-digit game codes without collisions.
+
+    Codes walk a full-period permutation of the code space from a random
+    offset, so a process never repeats one until all have been used; the
+    live-table check skips codes already in use. Only the unique constraint
+    on GameMatrix.game_code settles a race with another process, so rows are
+    created through create_matrix/create_matrices, which retry on it.
+    """
+
+    def __init__(self, low=CODE_MIN, high=CODE_MAX, rng=None):
+        rng = rng or random.SystemRandom()
+        self.low = low
+        self.span = high - low + 1
+        self.step = self._coprime_step(rng)
+        self.counter = itertools.count(rng.randrange(self.span))
+        self.lock = threading.Lock()
+
+    def _coprime_step(self, rng):
+        while True:
+            step = rng.randrange(self.span // 3, self.span)
+            if math.gcd(step, self.span) == 1:
+                return step
+
+    def next_code(self):
+        with self.lock:
+            index = next(self.counter)
+        return str(self.low + (index * self.step) % self.span)
+
+    def allocate(self):
+        while True:
+            code = self.next_code()
+            if not GameMatrix.objects.filter(game_code=code).exists():
+                return code
+
+    def allocate_many(self, count):
+        # One existence check per batch instead of one per code.
+        allocated = set()
+        while len(allocated) < count:
+            batch = {self.next_code() for _ in range(count - len(allocated))} - allocated
+            taken = set(GameMatrix.objects.filter(game_code__in=batch).values_list('game_code', flat=True))
+            allocated |= batch - taken
+        return sorted(allocated)
+
+    def create_matrix(self, extra=None, **fields):
+        """Create a GameMatrix on a free code; extra(matrix) runs in the same transaction.
+
+        The code is checked before the transaction opens: on SQLite a
+        transaction that reads first and then writes can't wait for other
+        writers and fails with "database is locked" straight away.
+        """
+        for _ in range(CODE_ATTEMPTS):
+            game_code = self.allocate()
+            try:
+                with transaction.atomic():
+                    game_matrix = GameMatrix.objects.create(game_code=game_code, **fields)
+                    if extra is not None:
+                        extra(game_matrix)
+                    return game_matrix
+            except IntegrityError:
+                # Another process created the same code since we checked it.
+                continue
+        raise IntegrityError('no free game code after %d attempts' % CODE_ATTEMPTS)
+
+    def create_matrices(self, count, **fields):
+        for _ in range(CODE_ATTEMPTS):
+            game_codes = self.allocate_many(count)
+            try:
+                with transaction.atomic():
+                    created = GameMatrix.objects.bulk_create([
+                        GameMatrix(game_code=game_code, **fields) for game_code in game_codes
+                    ])
+            except IntegrityError:
+                continue
+            if all(matrix.id is not None for matrix in created):
+                return created
+            # Backends that can't return ids from a bulk insert: one query for the lot.
+            by_code = GameMatrix.objects.filter(game_code__in=game_codes).in_bulk(field_name='game_code')
+            return [by_code[game_code] for game_code in game_codes]
+        raise IntegrityError('no free game codes after %d attempts' % CODE_ATTEMPTS)
+
+
+codes = GameCodeAllocator()
+
+
+def create_match(creator, opponent, board_size=DEFAULT_SIZE, win_length=DEFAULT_WIN_LENGTH):
+    # Exactly one GameMatrix/Game pair per match, written in one transaction.
+    def create_game(game_matrix):
+        Game.objects.create(game_code=game_matrix.game_code, game_creator=creator, game_opponent=opponent, game_matrix=game_matrix)
+
+    game_matrix = codes.create_matrix(create_game, board_size=board_size, win_length=win_length)
+    return game_matrix.game_code, game_matrix.id
+
+
+class Ticket:
+    __slots__ = ('id', 'player_name', 'variant', 'reply_channel', 'cancelled')
+
+    def __init__(self, ticket_id, player_name, variant, reply_channel):
+        self.id = ticket_id
+        self.player_name = player_name
+        self.variant = variant
+        self.reply_channel = reply_channel
+        self.cancelled = False
+
+
+class Matchmaker:
+    """Pairs waiting players in arrival order, per board variant.
+
+    Joins go through an asyncio queue drained by a single task, so pairing
+    and match creation never race; pairing itself is an O(1) pop from the
+    head of the variant's waiting list.
+    """
+
+    def __init__(self):
+        self.requests = None
+        self.waiting = {}
+        self.ticket_ids = itertools.count(1)
+        self._task = None
+
+    def join(self, player_name, reply_channel, board_size=DEFAULT_SIZE, win_length=DEFAULT_WIN_LENGTH):
+        if self._task is None or self._task.done():
+            self.requests = asyncio.Queue()
+            self._task = asyncio.ensure_future(self.run())
+        ticket = Ticket(next(self.ticket_ids), player_name, (board_size, win_length), reply_channel)
+        self.requests.put_nowait(ticket)
+        return ticket
+
+    def leave(self, ticket):
+        ticket.cancelled = True
+        waiting = self.waiting.get(ticket.variant)
+        if waiting is not None:
+            waiting.pop(ticket.id, None)
+
+    async def run(self):
+        while True:
+            ticket = await self.requests.get()
+            if ticket.cancelled:
+                continue
+            waiting = self.waiting.setdefault(ticket.variant, OrderedDict())
+            if not waiting:
+                waiting[ticket.id] = ticket
+                continue
+            _, creator = waiting.popitem(last=False)
+            try:
+                await self.start_match(creator, ticket)
+            except Exception:
+                # Put both players back rather than losing them to one bad match.
+                logger.exception('could not start match for %s and %s', creator.player_name, ticket.player_name)
+                waiting[creator.id] = creator
+                waiting[ticket.id] = ticket
+
+    async def start_match(self, creator, opponent):
+        board_size, win_length = creator.variant
+        game_code, game_matrix_id = await game_sync_to_async(create_match)(
+            creator.player_name, opponent.player_name, board_size, win_length
+        )
+        channel_layer = get_channel_layer()
+        for ticket, player_type, other in ((creator, 'null', opponent), (opponent, 'on', creator)):
+            await channel_layer.send(ticket.reply_channel, {
+                'type': 'match.found',
+                'game_code': game_code,
+                'game_matrix_id': game_matrix_id,
+                'player_type': player_type,
+                'opponent': other.player_name,
+                'board_size': board_size,
+                'win_length': win_length,
+            })
+
+
+matchmaker = Matchmaker()
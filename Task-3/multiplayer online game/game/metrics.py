@@ -0,0 +1,175 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from django.conf import settings
+
+# Prometheus text exposition (format 0.0.4) without a client library. Every
+# worker process serves its own numbers; the scraper sums across workers.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def metrics_path():
+    return getattr(settings, 'GAME_METRICS_PATH', '/metrics')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in pairs) + '}'
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        return [f'{self.name}{_labels(self.label_names, key)} {value}' for key, value in self.values.items()]
+
+
+class Gauge(Metric):
+    """Read when scraped from `collect`, a callable returning {label values: value}."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, collect, labels=()):
+        super().__init__(name, documentation, labels)
+        self.collect = collect
+
+    def render(self):
+        return [f'{self.name}{_labels(self.label_names, key)} {value}' for key, value in self.collect().items()]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        self.series = {}
+
+    def observe(self, value, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self):
+        lines = []
+        for key, (counts, total) in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, key, [("le", le)])} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, key)} {total}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, key)} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def _sockets():
+    from . import gauges
+    return {(kind,): count for kind, count in gauges.sockets.items()}
+
+
+def _worker_state():
+    from . import gauges
+    return {(name,): value for name, value in gauges.snapshot().items() if name not in ('player_sockets', 'spectator_sockets')}
+
+
+def _queue_depth():
+    # Only layers that keep their queues in this process can be measured.
+    from channels.layers import get_channel_layer
+    channels = getattr(get_channel_layer(), 'channels', None)
+    if not isinstance(channels, dict):
+        return {}
+    depths = [queue.qsize() for queue in channels.values()]
+    return {('total',): sum(depths), ('max',): max(depths, default=0), ('channels',): len(depths)}
+
+
+CONNECTIONS = registry.register(Gauge(
+    'game_connections_active', 'Open game websockets on this worker.', _sockets, labels=('kind',),
+))
+WORKER_STATE = registry.register(Gauge(
+    'game_worker_state', 'Live games, held seats, cached lobbies and memory on this worker.', _worker_state, labels=('gauge',),
+))
+QUEUE_DEPTH = registry.register(Gauge(
+    'game_channel_layer_queue_depth', 'Messages waiting in the in-process channel layer.', _queue_depth, labels=('stat',),
+))
+MOVES = registry.register(Counter(
+    'game_moves_total', 'Moves applied by games this worker owns.',
+))
+REJECTED = registry.register(Counter(
+    'game_moves_rejected_total', 'Moves dropped before reaching a board, by reason.', labels=('reason',),
+))
+MOVE_STAGES = registry.register(Histogram(
+    'game_move_stage_seconds', 'Time spent per stage of a move.', labels=('stage',),
+))
+
+
+class MetricsMiddleware:
+    """Serves the registry on GAME_METRICS_PATH and passes every other request on."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] != metrics_path():
+            return await self.app(scope, receive, send)
+        body = registry.render().encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/plain; version=0.0.4; charset=utf-8'),
+                (b'content-length', str(len(body)).encode('ascii')),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
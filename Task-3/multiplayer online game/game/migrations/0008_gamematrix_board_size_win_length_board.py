@@ -0,0 +1,28 @@
+# Generated by Django 4.1.2 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0007_alter_gamematrix_matrix_map'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamematrix',
+            name='board',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.AddField(
+            model_name='gamematrix',
+            name='board_size',
+            field=models.PositiveSmallIntegerField(default=3),
+        ),
+        migrations.AddField(
+            model_name='gamematrix',
+            name='win_length',
+            field=models.PositiveSmallIntegerField(default=3),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.2 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0008_gamematrix_board_size_win_length_board'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='game',
+            name='game_code',
+            field=models.CharField(db_index=True, max_length=6),
+        ),
+        migrations.AlterField(
+            model_name='gamematrix',
+            name='game_code',
+            field=models.CharField(db_index=True, max_length=6),
+        ),
+    ]
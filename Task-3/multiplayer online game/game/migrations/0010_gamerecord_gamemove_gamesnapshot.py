@@ -0,0 +1,54 @@
+# Generated by Django 4.1.2 on 2026-10-18 13:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0009_alter_game_game_code_alter_gamematrix_game_code'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('game_matrix_id', models.BigIntegerField(unique=True)),
+                ('game_code', models.CharField(db_index=True, max_length=6)),
+                ('game_creator', models.CharField(max_length=50)),
+                ('game_opponent', models.CharField(default='to-be-decided', max_length=50)),
+                ('board_size', models.PositiveSmallIntegerField(default=3)),
+                ('win_length', models.PositiveSmallIntegerField(default=3)),
+                ('result', models.PositiveSmallIntegerField(default=0)),
+                ('started', models.DateTimeField(auto_now_add=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GameMove',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.PositiveSmallIntegerField()),
+                ('cell', models.PositiveSmallIntegerField()),
+                ('symbol', models.PositiveSmallIntegerField()),
+                ('record', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='moves', to='game.gamerecord', to_field='game_matrix_id')),
+            ],
+            options={
+                'unique_together': {('record', 'seq')},
+            },
+        ),
+        migrations.CreateModel(
+            name='GameSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.PositiveSmallIntegerField()),
+                ('board', models.BinaryField()),
+                ('record', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='game.gamerecord', to_field='game_matrix_id')),
+            ],
+            options={
+                'unique_together': {('record', 'seq')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.1.2 on 2026-10-18 15:20
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0010_gamerecord_gamemove_gamesnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamematrix',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='gamematrix',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.1.2 on 2026-10-18 17:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0012_playerrating'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tournament',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('format', models.CharField(choices=[('swiss', 'Swiss'), ('knockout', 'Knockout')], default='swiss', max_length=10)),
+                ('board_size', models.PositiveSmallIntegerField(default=3)),
+                ('win_length', models.PositiveSmallIntegerField(default=3)),
+                ('rounds', models.PositiveSmallIntegerField(default=0)),
+                ('current_round', models.PositiveSmallIntegerField(default=0)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('running', 'Running'), ('finished', 'Finished')], default='open', max_length=10)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TournamentEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('player_name', models.CharField(max_length=50)),
+                ('seed', models.PositiveIntegerField()),
+                ('score', models.FloatField(default=0.0)),
+                ('byes', models.PositiveSmallIntegerField(default=0)),
+                ('eliminated', models.BooleanField(default=False)),
+                ('tournament', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='game.tournament')),
+            ],
+            options={
+                'unique_together': {('tournament', 'player_name')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TournamentMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('round', models.PositiveSmallIntegerField()),
+                ('creator', models.CharField(max_length=50)),
+                ('opponent', models.CharField(blank=True, max_length=50)),
+                ('game_code', models.CharField(blank=True, max_length=6)),
+                ('game_matrix_id', models.BigIntegerField(blank=True, null=True)),
+                ('result', models.PositiveSmallIntegerField(default=0)),
+                ('tournament', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='game.tournament')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tournament', 'round'], name='game_tourna_tournam_d4a6b2_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.1.2 on 2026-10-19 09:10
+
+from django.db import migrations, models
+
+
+def recode_duplicates(apps, schema_editor):
+    # Codes could repeat before they were unique: keep the newest game on
+    # each code and move the older ones (and their Game rows) to free codes.
+    GameMatrix = apps.get_model('game', 'GameMatrix')
+    Game = apps.get_model('game', 'Game')
+    duplicated = (
+        GameMatrix.objects.values('game_code').annotate(count=models.Count('id'))
+        .filter(count__gt=1).values_list('game_code', flat=True)
+    )
+    used = set(GameMatrix.objects.values_list('game_code', flat=True))
+    free = (str(code) for code in range(999999, 111110, -1) if str(code) not in used)
+    for game_code in list(duplicated):
+        for matrix in GameMatrix.objects.filter(game_code=game_code).order_by('-id')[1:]:
+            matrix.game_code = next(free)
+            matrix.save(update_fields=['game_code'])
+            Game.objects.filter(game_matrix_id=matrix.id).update(game_code=matrix.game_code)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0013_tournament'),
+    ]
+
+    operations = [
+        migrations.RunPython(recode_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='gamematrix',
+            name='game_code',
+            field=models.CharField(max_length=6, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.2 on 2026-10-19 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0014_alter_gamematrix_game_code_unique'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='playerrating',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
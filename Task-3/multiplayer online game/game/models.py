@@ -1,16 +1,119 @@
 from django.db import models
 import json
+from . import bitboard
 
 # Create your models here.
 class Game(models.Model):
-    game_code = models.CharField(max_length=6)
+    game_code = models.CharField(max_length=6, db_index=True)
     game_creator = models.CharField(max_length=50)
     game_opponent = models.CharField(max_length=50, default='to-be-decided')
     game_matrix = models.ForeignKey("GameMatrix", on_delete=models.CASCADE)
 
 class GameMatrix(models.Model):
-    game_code = models.CharField(max_length=6)
+    # Unique, so two processes can never open the same code.
+    game_code = models.CharField(max_length=6, unique=True)
     matrix_map = models.CharField(max_length=50, default="[1,2,3,4,5,6,7,8,9]")
+    board_size = models.PositiveSmallIntegerField(default=bitboard.DEFAULT_SIZE)
+    win_length = models.PositiveSmallIntegerField(default=bitboard.DEFAULT_WIN_LENGTH)
+    board = models.BinaryField(default=b'')
+    # For the reaper: lobbies nobody joined and games nobody is playing.
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated = models.DateTimeField(auto_now=True, db_index=True)
 
     def get_map(self):
-        return json.loads(self.matrix_map)
\ No newline at end of file
+        return json.loads(self.matrix_map)
+
+    def get_boards(self):
+        if self.board:
+            return bitboard.unpack(self.board, self.board_size)
+        return bitboard.from_map(self.get_map())
+
+    def set_boards(self, x_board, o_board):
+        self.board = bitboard.pack(x_board, o_board, self.board_size)
+        # matrix_map only fits the classic board; keep it readable there.
+        if self.board_size == bitboard.DEFAULT_SIZE:
+            self.matrix_map = json.dumps(bitboard.to_map(x_board, o_board))
+
+
+class GameRecord(models.Model):
+    # Outlives its GameMatrix, so finished games can still be replayed and analysed.
+    game_matrix_id = models.BigIntegerField(unique=True)
+    game_code = models.CharField(max_length=6, db_index=True)
+    game_creator = models.CharField(max_length=50)
+    game_opponent = models.CharField(max_length=50, default='to-be-decided')
+    board_size = models.PositiveSmallIntegerField(default=bitboard.DEFAULT_SIZE)
+    win_length = models.PositiveSmallIntegerField(default=bitboard.DEFAULT_WIN_LENGTH)
+    result = models.PositiveSmallIntegerField(default=0)
+    started = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+class GameMove(models.Model):
+    record = models.ForeignKey(GameRecord, on_delete=models.CASCADE, to_field='game_matrix_id', related_name='moves')
+    seq = models.PositiveSmallIntegerField()
+    cell = models.PositiveSmallIntegerField()
+    symbol = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = [('record', 'seq')]
+
+class GameSnapshot(models.Model):
+    record = models.ForeignKey(GameRecord, on_delete=models.CASCADE, to_field='game_matrix_id', related_name='snapshots')
+    seq = models.PositiveSmallIntegerField()
+    board = models.BinaryField()
+
+    class Meta:
+        unique_together = [('record', 'seq')]
+
+class PlayerRating(models.Model):
+    # Written in batches from the in-memory leaderboard; see game.ratings.
+    name = models.CharField(max_length=50, unique=True)
+    rating = models.FloatField(default=1200.0)
+    games = models.PositiveIntegerField(default=0)
+    wins = models.PositiveIntegerField(default=0)
+    losses = models.PositiveIntegerField(default=0)
+    draws = models.PositiveIntegerField(default=0)
+    # Indexed: each worker's leaderboard reads back the rows changed since its last look.
+    updated = models.DateTimeField(auto_now=True, db_index=True)
+
+class Tournament(models.Model):
+    SWISS = 'swiss'
+    KNOCKOUT = 'knockout'
+    FORMATS = [(SWISS, 'Swiss'), (KNOCKOUT, 'Knockout')]
+
+    OPEN = 'open'
+    RUNNING = 'running'
+    FINISHED = 'finished'
+    STATUSES = [(OPEN, 'Open'), (RUNNING, 'Running'), (FINISHED, 'Finished')]
+
+    name = models.CharField(max_length=50)
+    format = models.CharField(max_length=10, choices=FORMATS, default=SWISS)
+    board_size = models.PositiveSmallIntegerField(default=bitboard.DEFAULT_SIZE)
+    win_length = models.PositiveSmallIntegerField(default=bitboard.DEFAULT_WIN_LENGTH)
+    rounds = models.PositiveSmallIntegerField(default=0)
+    current_round = models.PositiveSmallIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUSES, default=OPEN)
+    created = models.DateTimeField(auto_now_add=True)
+
+class TournamentEntry(models.Model):
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='entries')
+    player_name = models.CharField(max_length=50)
+    seed = models.PositiveIntegerField()
+    score = models.FloatField(default=0.0)
+    byes = models.PositiveSmallIntegerField(default=0)
+    eliminated = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = [('tournament', 'player_name')]
+
+class TournamentMatch(models.Model):
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='matches')
+    round = models.PositiveSmallIntegerField()
+    creator = models.CharField(max_length=50)
+    opponent = models.CharField(max_length=50, blank=True)
+    # Plain ids: the GameMatrix goes away with the game, its GameRecord stays.
+    game_code = models.CharField(max_length=6, blank=True)
+    game_matrix_id = models.BigIntegerField(null=True, blank=True)
+    result = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['tournament', 'round'])]
\ No newline at end of file
@@ -0,0 +1,184 @@
+import json
+import struct
+from hashlib import blake2b
+from . import bitboard
+from .bitboard import PLAYER_X, PLAYER_O, DRAW
+
+# Wire protocol for game sockets.
+#
+# Clients pick an encoding with the websocket subprotocol at connect time.
+# Without one they get the legacy pair of "result"/"chance" JSON messages.
+# Versioned clients get one frame per move carrying the move, a hash of the
+# board after it and the outcome:
+#
+#   json:   {"v": 1, "p": 5, "s": 1, "h": "<16 hex>", "o": 0}  (+ "w": name)
+#   binary: !BHBBQ = version, position, symbol, outcome, hash (+ utf-8 name)
+#
+# Binary clients may also send their moves as a packed !H position.
+#
+# Spectators that fall behind get a snapshot of the whole board instead:
+#
+#   json:   {"v": 1, "n": 9, "z": 3, "k": 3, "b": "<packed board hex>", "h": "<16 hex>", "o": 0}
+#   binary: !BBBHBQ = version | SNAPSHOT_FLAG, size, win length, moves, outcome, hash
+#           (+ packed board)
+#
+# Right after connecting, versioned clients get a token to resume the seat with
+# (?resume=<token>&seen=<moves seen>) if the socket drops:
+#
+#   json:   {"v": 1, "r": "<token>", "n": 4}
+#   binary: !BH = version | RESUME_FLAG, moves (+ utf-8 token)
+#
+# A socket closed with code CLOSE_GAME_GONE has no game left to resume: it was
+# reaped or deleted.
+
+PROTOCOL_VERSION = 1
+
+LEGACY = 'legacy'
+JSON = 'json'
+BINARY = 'binary'
+
+SUBPROTOCOLS = {
+    'ttt.v1.json': JSON,
+    'ttt.v1.bin': BINARY,
+}
+
+SYMBOL_X = 1
+SYMBOL_O = 2
+
+OUTCOME_ONGOING = 0
+OUTCOME_X_WINS = 1
+OUTCOME_O_WINS = 2
+OUTCOME_DRAW = 3
+
+MOVE_STRUCT = struct.Struct('!BHBBQ')
+SNAPSHOT_STRUCT = struct.Struct('!BBBHBQ')
+SNAPSHOT_FLAG = 0x80
+RESUME_STRUCT = struct.Struct('!BH')
+RESUME_FLAG = 0x40
+POSITION_STRUCT = struct.Struct('!H')
+CLOSE_GAME_GONE = 4404
+
+
+def negotiate(scope):
+    # Returns (encoding, subprotocol to accept with).
+    for subprotocol in scope.get('subprotocols') or ():
+        if subprotocol in SUBPROTOCOLS:
+            return SUBPROTOCOLS[subprotocol], subprotocol
+    return LEGACY, None
+
+
+def decode_position(event):
+    # None for anything that isn't a position, so junk is dropped unanswered.
+    try:
+        if event.get('bytes') is not None:
+            return POSITION_STRUCT.unpack(event['bytes'][:POSITION_STRUCT.size])[0]
+        return int(event['text'])
+    except (struct.error, TypeError, ValueError):
+        return None
+
+
+def board_hash(x_board, o_board, size=bitboard.DEFAULT_SIZE):
+    digest = blake2b(bitboard.pack(x_board, o_board, size), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def outcome_code(result):
+    if result is DRAW:
+        return OUTCOME_DRAW
+    if result == PLAYER_X:
+        return OUTCOME_X_WINS
+    if result == PLAYER_O:
+        return OUTCOME_O_WINS
+    return OUTCOME_ONGOING
+
+
+def encode_move(position, player_type, player_name, result, state_hash):
+    # Every encoding is built once per move so fan-out never re-serializes.
+    symbol = SYMBOL_X if player_type == 'null' else SYMBOL_O
+    outcome = outcome_code(result)
+    winner = player_name if outcome in (OUTCOME_X_WINS, OUTCOME_O_WINS) else None
+
+    legacy = []
+    if winner is not None:
+        legacy.append(json.dumps({"msg_type":"result", "msg":winner}))
+    elif outcome == OUTCOME_DRAW:
+        legacy.append(json.dumps({"msg_type":"result", "msg":"game drawn"}))
+    legacy.append(json.dumps({"msg_type":"chance", "position":str(position), "symbol":player_type}))
+
+    frame = {'v': PROTOCOL_VERSION, 'p': position, 's': symbol, 'h': format(state_hash, '016x'), 'o': outcome}
+    if winner is not None:
+        frame['w'] = winner
+
+    binary = MOVE_STRUCT.pack(PROTOCOL_VERSION, position, symbol, outcome, state_hash)
+    if winner is not None:
+        binary += winner.encode('utf-8')
+
+    return {
+        LEGACY: legacy,
+        JSON: json.dumps(frame, separators=(',', ':')),
+        BINARY: binary,
+    }
+
+
+def encode_snapshot(encoding, x_board, o_board, size, win_length, move_count, result, state_hash):
+    board = bitboard.pack(x_board, o_board, size)
+    outcome = outcome_code(result)
+    if encoding == BINARY:
+        return SNAPSHOT_STRUCT.pack(
+            PROTOCOL_VERSION | SNAPSHOT_FLAG, size, win_length, move_count, outcome, state_hash,
+        ) + board
+    return json.dumps({
+        'v': PROTOCOL_VERSION, 'n': move_count, 'z': size, 'k': win_length,
+        'b': board.hex(), 'h': format(state_hash, '016x'), 'o': outcome,
+    }, separators=(',', ':'))
+
+
+def decode_snapshot(frame):
+    if isinstance(frame, (bytes, bytearray)):
+        version, size, win_length, move_count, outcome, state_hash = SNAPSHOT_STRUCT.unpack_from(frame)
+        board = bytes(frame[SNAPSHOT_STRUCT.size:])
+        version &= ~SNAPSHOT_FLAG
+    else:
+        frame = json.loads(frame)
+        version, size, win_length, move_count, outcome = frame['v'], frame['z'], frame['k'], frame['n'], frame['o']
+        state_hash, board = int(frame['h'], 16), bytes.fromhex(frame['b'])
+    x_board, o_board = bitboard.unpack(board, size)
+    return {
+        'v': version, 'n': move_count, 'z': size, 'k': win_length, 'b': (x_board, o_board),
+        'h': format(state_hash, '016x'), 'o': outcome,
+    }
+
+
+def encode_resume(encoding, token, move_count):
+    if encoding == BINARY:
+        return RESUME_STRUCT.pack(PROTOCOL_VERSION | RESUME_FLAG, move_count) + token.encode('utf-8')
+    return json.dumps({'v': PROTOCOL_VERSION, 'r': token, 'n': move_count}, separators=(',', ':'))
+
+
+def decode_resume(frame):
+    if isinstance(frame, (bytes, bytearray)):
+        version, move_count = RESUME_STRUCT.unpack_from(frame)
+        return {'v': version & ~RESUME_FLAG, 'r': frame[RESUME_STRUCT.size:].decode('utf-8'), 'n': move_count}
+    return json.loads(frame)
+
+
+def is_resume(frame):
+    if isinstance(frame, (bytes, bytearray)):
+        return bool(frame[0] & RESUME_FLAG)
+    return '"r":' in frame
+
+
+def is_snapshot(frame):
+    if isinstance(frame, (bytes, bytearray)):
+        return bool(frame[0] & SNAPSHOT_FLAG)
+    return '"b":' in frame
+
+
+def decode_move(frame):
+    if isinstance(frame, (bytes, bytearray)):
+        version, position, symbol, outcome, state_hash = MOVE_STRUCT.unpack_from(frame)
+        winner = frame[MOVE_STRUCT.size:].decode('utf-8') or None
+        return {'v': version, 'p': position, 's': symbol, 'h': format(state_hash, '016x'), 'o': outcome, 'w': winner}
+    frame = json.loads(frame)
+    frame.setdefault('w', None)
+    return frame
@@ -0,0 +1,257 @@
+import asyncio
+import logging
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .bitboard import PLAYER_X, DRAW
+from .db import game_sync_to_async
+from .models import PlayerRating
+
+logger = logging.getLogger(__name__)
+
+START_RATING = 1200.0
+K_FACTOR = 32
+# Ranks are counted over whole rating points in [0, MAX_RATING].
+MAX_RATING = 4000
+# Rows re-read on each refresh from before the last one, so a write that
+# committed late (or on a worker with a slow clock) is never missed.
+REFRESH_OVERLAP = timedelta(seconds=30)
+
+
+def rated():
+    return getattr(settings, 'GAME_RATED', True)
+
+
+def flush_interval():
+    return getattr(settings, 'GAME_RATING_FLUSH_INTERVAL', 5.0)
+
+
+def flush_batch():
+    return getattr(settings, 'GAME_RATING_FLUSH_BATCH', 200)
+
+
+def top_ttl():
+    return getattr(settings, 'GAME_LEADERBOARD_TTL', 10.0)
+
+
+def expected_score(rating, other):
+    return 1 / (1 + 10 ** ((other - rating) / 400))
+
+
+def elo(rating, other, score, k=K_FACTOR):
+    # score is 1 for a win, 0.5 for a draw and 0 for a loss.
+    return rating + k * (score - expected_score(rating, other))
+
+
+class FenwickTree:
+    """Prefix counts over rating points, O(log n) to update or query."""
+
+    def __init__(self, size):
+        self.size = size
+        self.tree = [0] * (size + 1)
+
+    def add(self, index, amount):
+        index += 1
+        while index <= self.size:
+            self.tree[index] += amount
+            index += index & -index
+
+    def prefix(self, index):
+        # Count of entries at or below index.
+        index += 1
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+
+def bucket(rating):
+    return min(MAX_RATING, max(0, int(round(rating))))
+
+
+class Leaderboard:
+    """Ratings of every rated player, kept in memory and ranked in O(log n).
+
+    Loaded from PlayerRating on first use. Updates are applied here first,
+    and their deltas are written back in batches with F() expressions, so
+    workers rating games at the same time don't overwrite each other. Once
+    a GAME_RATING_FLUSH_INTERVAL the rows other workers have written since
+    are read back, so every process ranks and rates from the same numbers,
+    at most one flush behind.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.read_at = None
+        self.checked = 0.0
+        self.ratings = {}
+        self.counts = FenwickTree(MAX_RATING + 1)
+        self.buckets = {}
+        self.pending = {}
+        self._top = {}
+
+    def stale(self):
+        return not self.loaded or time.monotonic() - self.checked >= flush_interval()
+
+    def refresh(self):
+        # Everything the first time, then the rows written since the last read.
+        started = timezone.now()
+        rows = PlayerRating.objects.all()
+        if self.loaded:
+            rows = rows.filter(updated__gte=self.read_at - REFRESH_OVERLAP)
+        rows = list(rows.values_list('name', 'rating'))
+        with self.lock:
+            for name, rating in rows:
+                # Changes this process hasn't written yet aren't in the row.
+                pending = self.pending.get(name)
+                self._place(name, rating + (pending[0] if pending else 0.0))
+            if self.loaded and rows:
+                self._top.clear()
+            self.read_at = started
+            self.checked = time.monotonic()
+            self.loaded = True
+
+    def _place(self, name, rating):
+        old = self.ratings.get(name)
+        if old is not None:
+            old_bucket = bucket(old)
+            self.counts.add(old_bucket, -1)
+            self.buckets[old_bucket].discard(name)
+        self.ratings[name] = rating
+        new_bucket = bucket(rating)
+        self.counts.add(new_bucket, 1)
+        self.buckets.setdefault(new_bucket, set()).add(name)
+
+    def rating(self, name):
+        return self.ratings.get(name)
+
+    def rank(self, name):
+        # 1 + players rated strictly higher; ties share a rank.
+        with self.lock:
+            rating = self.ratings.get(name)
+            if rating is None:
+                return None
+            return len(self.ratings) - self.counts.prefix(bucket(rating)) + 1
+
+    def top(self, count):
+        now = time.monotonic()
+        cached = self._top.get(count)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        rows = []
+        with self.lock:
+            for points in range(MAX_RATING, -1, -1):
+                names = self.buckets.get(points)
+                if not names:
+                    continue
+                rank = len(rows) + 1
+                for name in sorted(names, key=lambda name: -self.ratings[name]):
+                    rows.append({'name': name, 'rating': round(self.ratings[name], 1), 'rank': rank})
+                if len(rows) >= count:
+                    break
+        rows = rows[:count]
+        self._top[count] = (now + top_ttl(), rows)
+        return rows
+
+    def record(self, creator, opponent, result):
+        """Apply one finished game between creator (X) and opponent (O)."""
+        with self.lock:
+            x_rating = self.ratings.get(creator, START_RATING)
+            o_rating = self.ratings.get(opponent, START_RATING)
+            x_score = 0.5 if result is DRAW else (1.0 if result == PLAYER_X else 0.0)
+            new_x = elo(x_rating, o_rating, x_score)
+            new_o = elo(o_rating, x_rating, 1.0 - x_score)
+            self._place(creator, new_x)
+            self._place(opponent, new_o)
+            self._pend(creator, new_x - x_rating, x_score)
+            self._pend(opponent, new_o - o_rating, 1.0 - x_score)
+            return new_x, new_o
+
+    def _pend(self, name, delta, score):
+        entry = self.pending.setdefault(name, [0.0, 0, 0, 0, 0])
+        entry[0] += delta
+        entry[1] += 1
+        entry[2 if score == 1.0 else 3 if score == 0.0 else 4] += 1
+
+    def take_pending(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        return pending
+
+    def restore_pending(self, pending):
+        with self.lock:
+            for name, entry in pending.items():
+                current = self.pending.setdefault(name, [0.0, 0, 0, 0, 0])
+                for index, value in enumerate(entry):
+                    current[index] += value
+
+
+def write_ratings(pending):
+    with transaction.atomic():
+        PlayerRating.objects.bulk_create(
+            [PlayerRating(name=name) for name in pending], ignore_conflicts=True,
+        )
+        for name, (delta, games, wins, losses, draws) in pending.items():
+            PlayerRating.objects.filter(name=name).update(
+                rating=F('rating') + delta, games=F('games') + games,
+                wins=F('wins') + wins, losses=F('losses') + losses, draws=F('draws') + draws,
+                updated=timezone.now(),
+            )
+
+
+class RatingFlusher:
+    """Writes pending rating changes every GAME_RATING_FLUSH_INTERVAL seconds,
+    or sooner once GAME_RATING_FLUSH_BATCH players are waiting."""
+
+    def __init__(self, leaderboard):
+        self.leaderboard = leaderboard
+        self.wake = None
+        self._task = None
+
+    def ensure_started(self):
+        if self._task is not None and not self._task.done():
+            return
+        self.wake = asyncio.Event()
+        self._task = asyncio.ensure_future(self.run())
+
+    def poke(self):
+        if self.wake is not None and len(self.leaderboard.pending) >= flush_batch():
+            self.wake.set()
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wake.wait(), flush_interval())
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        pending = self.leaderboard.take_pending()
+        if not pending:
+            return
+        try:
+            await game_sync_to_async(write_ratings)(pending)
+        except Exception:
+            logger.exception('could not write %s rating changes', len(pending))
+            self.leaderboard.restore_pending(pending)
+
+
+leaderboard = Leaderboard()
+flusher = RatingFlusher(leaderboard)
+
+
+async def record_result(creator, opponent, result):
+    if leaderboard.stale():
+        await game_sync_to_async(leaderboard.refresh)()
+    flusher.ensure_started()
+    ratings = leaderboard.record(creator, opponent, result)
+    flusher.poke()
+    return ratings
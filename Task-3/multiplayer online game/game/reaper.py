@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from channels.layers import get_channel_layer
+from .db import game_sync_to_async
+from .models import GameMatrix
+from . import gauges
+
+logger = logging.getLogger(__name__)
+
+# Rows deleted per statement, so a big sweep never holds long locks.
+REAP_BATCH = 500
+
+
+def reap_interval():
+    return getattr(settings, 'GAME_REAP_INTERVAL', 60.0)
+
+
+def lobby_ttl():
+    return getattr(settings, 'GAME_LOBBY_TTL', 600.0)
+
+
+def idle_ttl():
+    return getattr(settings, 'GAME_IDLE_TTL', 3600.0)
+
+
+def _delete_in_batches(queryset):
+    deleted = []
+    while True:
+        rows = list(queryset.values_list('id', 'game_code')[:REAP_BATCH])
+        if not rows:
+            return deleted
+        GameMatrix.objects.filter(id__in=[matrix_id for matrix_id, _ in rows]).delete()
+        deleted.extend(rows)
+
+
+def reap_database(now=None):
+    """Delete lobbies nobody joined and games nobody has moved in.
+
+    Game rows go with their matrix; GameRecords are kept. A live game's
+    `updated` moves with every flush, so last activity alone tells which
+    ones are abandoned, whichever worker holds them. Returns the
+    (matrix id, game code) pairs of the lobbies and games deleted.
+    """
+    now = now or timezone.now()
+    lobbies = GameMatrix.objects.filter(
+        created__lt=now - timedelta(seconds=lobby_ttl()),
+        updated__lt=now - timedelta(seconds=lobby_ttl()),
+        game__isnull=True,
+    )
+    idle = GameMatrix.objects.filter(
+        updated__lt=now - timedelta(seconds=idle_ttl()),
+    )
+    return _delete_in_batches(lobbies), _delete_in_batches(idle)
+
+
+class Reaper:
+    """Background sweep keeping tables and per-worker state bounded.
+
+    Every GAME_REAP_INTERVAL seconds it drops live boards nobody has moved
+    on for GAME_IDLE_TTL (after writing them back), prunes the lobby cache,
+    and deletes abandoned rows, closing any sockets still open on them.
+    """
+
+    def __init__(self):
+        self._task = None
+
+    def ensure_started(self):
+        if reap_interval() <= 0 or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.ensure_future(self.run())
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(reap_interval())
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception('game reaper sweep failed')
+
+    async def sweep(self):
+        from .engine import engine
+        from .lobby import cache
+
+        cutoff = time.monotonic() - idle_ttl()
+        for game_code, state in list(engine.games.items()):
+            if state.touched < cutoff:
+                await engine.discard(game_code)
+        cache.prune()
+
+        lobbies, games = await game_sync_to_async(reap_database)()
+        channel_layer = get_channel_layer()
+        for game_matrix_id, game_code in lobbies + games:
+            await channel_layer.group_send(game_code, {
+                'type': 'game.closed',
+                'game_matrix_id': game_matrix_id,
+            })
+        logger.info('reaped %s lobbies and %s idle games; %s', len(lobbies), len(games), gauges.snapshot())
+        return len(lobbies), len(games)
+
+
+reaper = Reaper()
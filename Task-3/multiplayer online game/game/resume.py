@@ -0,0 +1,138 @@
+import asyncio
+import logging
+from urllib.parse import parse_qs
+from django.conf import settings
+from django.core import signing
+from . import protocol, sharding
+from .bitboard import PLAYER_X, ONGOING
+from .broadcast import board_of
+
+logger = logging.getLogger(__name__)
+
+SALT = 'game.resume'
+
+
+def resume_grace():
+    return getattr(settings, 'GAME_RESUME_GRACE', 30.0)
+
+
+def resume_group(game_code):
+    return f'resume-{game_code}'
+
+
+def issue_token(game_code, game_matrix_id, player_name, player_type):
+    return signing.dumps([game_code, str(game_matrix_id), player_name, player_type], salt=SALT, compress=True)
+
+
+def claim(scope, game_code, game_matrix_id, player_name, player_type):
+    """The last move number a reconnecting client saw, if it holds a token for this seat.
+
+    Clients resume with ?resume=<token>&seen=<moves seen>; anything that
+    doesn't check out is treated as a fresh connect.
+    """
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    token = query.get('resume', [None])[0]
+    if token is None:
+        return None
+    try:
+        seat = signing.loads(token, salt=SALT)
+        seen = int(query.get('seen', ['0'])[0])
+    except (signing.BadSignature, ValueError):
+        return None
+    if seat != [game_code, str(game_matrix_id), player_name, player_type] or seen < 0:
+        return None
+    return seen
+
+
+def catch_up(state, seen, encoding):
+    # Frames for the moves played after `seen`; a board snapshot when those
+    # moves are no longer in memory (the state was adopted mid-game).
+    missed = state.moves_since(seen)
+    if missed is None:
+        return [protocol.encode_snapshot(encoding, *board_of(state))]
+
+    x_board, o_board = state.x_board, state.o_board
+    for cell, symbol in missed:
+        if symbol == PLAYER_X:
+            x_board &= ~(1 << cell)
+        else:
+            o_board &= ~(1 << cell)
+
+    frames = []
+    for index, (cell, symbol) in enumerate(missed):
+        if symbol == PLAYER_X:
+            x_board |= 1 << cell
+        else:
+            o_board |= 1 << cell
+        result = state.result if index == len(missed) - 1 else ONGOING
+        frames.append(protocol.encode_move(
+            cell + 1, 'null' if symbol == PLAYER_X else 'on', state.names.get(symbol), result,
+            protocol.board_hash(x_board, o_board, state.board_size),
+        )[encoding])
+    return frames
+
+
+class ResumeRegistry:
+    """Seats whose socket dropped, kept open for GAME_RESUME_GRACE seconds.
+
+    If the player hasn't reconnected by then the game is closed as it used
+    to be on disconnect. With several workers a reconnect may land anywhere,
+    so it is also announced on the game's resume group.
+    """
+
+    def __init__(self):
+        self.pending = {}
+
+    def hold(self, channel_layer, game_code, player_type, close):
+        key = (game_code, player_type)
+        previous = self.pending.pop(key, None)
+        if previous is not None:
+            previous.cancel()
+        self.pending[key] = asyncio.ensure_future(self._expire(channel_layer, key, close))
+
+    async def resume(self, channel_layer, game_code, player_type):
+        task = self.pending.pop((game_code, player_type), None)
+        if task is not None:
+            task.cancel()
+        elif sharding.shard_count() > 1:
+            await channel_layer.group_send(resume_group(game_code), {
+                'type': 'game.resumed',
+                'player_type': player_type,
+            })
+
+    async def _expire(self, channel_layer, key, close):
+        game_code, player_type = key
+        grace = resume_grace()
+        if sharding.shard_count() > 1:
+            if await self._wait_for_resume(channel_layer, game_code, player_type, grace):
+                self.pending.pop(key, None)
+                return
+        elif grace > 0:
+            await asyncio.sleep(grace)
+        self.pending.pop(key, None)
+        try:
+            await close()
+        except Exception:
+            logger.exception('could not close %s', game_code)
+
+    async def _wait_for_resume(self, channel_layer, game_code, player_type, grace):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + grace
+        channel = await channel_layer.new_channel()
+        await channel_layer.group_add(resume_group(game_code), channel)
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return False
+                try:
+                    message = await asyncio.wait_for(channel_layer.receive(channel), remaining)
+                except asyncio.TimeoutError:
+                    return False
+                if message.get('player_type') == player_type:
+                    return True
+        finally:
+            await channel_layer.group_discard(resume_group(game_code), channel)
+
+
+registry = ResumeRegistry()
@@ -1,6 +1,16 @@
 from django.urls import path
 from . import consumers
+from . import sharding
 
 websocket_urlpatterns = [
     path('ws/asc/pg/<str:game_code>/<str:game_matrix_id>/<str:player_name>/<str:player_type>/', consumers.GameConsumer.as_asgi()),
-]
\ No newline at end of file
+    path('ws/asc/pg/<str:game_code>/<str:game_matrix_id>/<str:player_name>/<str:player_type>/<int:board_size>/<int:win_length>/', consumers.GameConsumer.as_asgi()),
+    path('ws/asc/watch/<str:game_code>/<str:game_matrix_id>/', consumers.SpectatorConsumer.as_asgi()),
+    path('ws/asc/mm/<str:player_name>/', consumers.MatchmakingConsumer.as_asgi()),
+    path('ws/asc/mm/<str:player_name>/<int:board_size>/<int:win_length>/', consumers.MatchmakingConsumer.as_asgi()),
+]
+
+channel_routes = {
+    sharding.shard_channel(shard): consumers.GameShardConsumer.as_asgi()
+    for shard in range(sharding.shard_count())
+}
\ No newline at end of file
@@ -0,0 +1,38 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from django.db import connections
+
+
+@contextmanager
+def scratch_database(alias='default', verbosity=0):
+    """Point the block at a freshly migrated throwaway database, then drop it.
+
+    For benchmarks and load runs, so nothing they create (games, records,
+    ratings) ever reaches the configured database. Yields the database NAME,
+    which worker processes have to be given as well.
+    """
+    connection = connections[alias]
+    old_name = connection.settings_dict['NAME']
+    old_test_name = connection.settings_dict['TEST'].get('NAME')
+    directory = None
+    if connection.vendor == 'sqlite':
+        # A file rather than Django's in-memory test database, so other processes can open it.
+        directory = tempfile.mkdtemp(prefix='game-scratch-')
+        connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'scratch.sqlite3')
+    name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield name
+    finally:
+        connections.close_all()
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        connection.settings_dict['TEST']['NAME'] = old_test_name
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def use_database(name, alias='default'):
+    # In a worker process: open the scratch database its parent created.
+    connections[alias].close()
+    connections[alias].settings_dict['NAME'] = name
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+from bisect import bisect
+from hashlib import blake2b
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Virtual nodes per shard; enough to keep the split even for a handful of workers.
+REPLICAS = 128
+
+
+def _hash(key):
+    return int.from_bytes(blake2b(str(key).encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Consistent-hash ring mapping game codes to owner shards.
+
+    Adding or removing a shard only moves the codes that hashed to it.
+    """
+
+    def __init__(self, nodes=(), replicas=REPLICAS):
+        self.replicas = replicas
+        self.points = []
+        self.owners = {}
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        for replica in range(self.replicas):
+            point = _hash(f'{node}:{replica}')
+            self.owners[point] = node
+        self.points = sorted(self.owners)
+
+    def remove(self, node):
+        self.owners = {point: owner for point, owner in self.owners.items() if owner != node}
+        self.points = sorted(self.owners)
+
+    def owner(self, key):
+        index = bisect(self.points, _hash(key)) % len(self.points)
+        return self.owners[self.points[index]]
+
+
+def shard_count():
+    return getattr(settings, 'GAME_SHARDS', 1)
+
+
+def shard_id():
+    return getattr(settings, 'GAME_SHARD_ID', 0)
+
+
+def shard_channel(shard):
+    return f'game-shard-{shard}'
+
+
+ring = HashRing(range(shard_count()))
+
+
+def owner(game_code):
+    return ring.owner(game_code)
+
+
+def is_local(game_code):
+    return shard_count() == 1 or owner(game_code) == shard_id()
+
+
+def owner_channel(game_code):
+    return shard_channel(owner(game_code))
+
+
+class ShardListener:
+    """Receives moves other workers forward to the games this worker owns.
+
+    Messages are handled one at a time so moves for a game apply in order.
+    """
+
+    def __init__(self):
+        self._task = None
+
+    def ensure_started(self, channel_layer, handler):
+        if shard_count() == 1 or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.ensure_future(self.run(channel_layer, handler))
+
+    async def run(self, channel_layer, handler):
+        channel = shard_channel(shard_id())
+        while True:
+            message = await channel_layer.receive(channel)
+            try:
+                await handler(channel_layer, message)
+            except Exception:
+                logger.exception('could not handle %s on %s', message.get('type'), channel)
+
+
+listener = ShardListener()
+
+
+class ListenerMiddleware:
+    """Starts the shard listener with the worker rather than on the first game socket.
+
+    Servers that speak the ASGI lifespan protocol start it at startup; the others
+    on the first scope of any kind, so forwarded moves are picked up before any
+    player reaches this worker.
+    """
+
+    def __init__(self, application, handler):
+        self.application = application
+        self.handler = handler
+
+    async def __call__(self, scope, receive, send):
+        from channels.layers import get_channel_layer
+
+        listener.ensure_started(get_channel_layer(), self.handler)
+        if scope['type'] != 'lifespan':
+            return await self.application(scope, receive, send)
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,35 @@
+const findOpponent = document.getElementById('find-opponent')
+
+findOpponent.onclick = function(){
+    const form = document.getElementById('player-form')
+    const playerName = form.elements['player_name'].value
+    if(playerName == ''){
+        form.elements['player_name'].focus()
+        return
+    }
+    const boardSize = form.elements['board_size'].value || 3
+    const winLength = form.elements['win_length'].value || 3
+
+    findOpponent.disabled = true
+    findOpponent.textContent = 'Waiting for an Opponent...'
+
+    var ws = new WebSocket('ws://127.0.0.1:8000/ws/asc/mm/' + playerName + '/' + boardSize + '/' + winLength + '/')
+
+    ws.onmessage = function(event){
+        var data = JSON.parse(event.data)
+        if(data.msg_type == 'match'){
+            form.elements['game_code'].value = data.game_code
+            form.elements['i_have_game_code'].checked = (data.player_type == 'on')
+            form.elements['board_size'].value = data.board_size
+            form.elements['win_length'].value = data.win_length
+            ws.close()
+            form.submit()
+        }
+    }
+
+    ws.onerror = function(event){
+        findOpponent.disabled = false
+        findOpponent.textContent = 'Find an Opponent'
+        console.log('connection aborted...', event)
+    }
+}
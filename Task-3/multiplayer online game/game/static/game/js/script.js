@@ -2,16 +2,42 @@ const gameCode = JSON.parse(document.getElementById('game-code').textContent)
 const playerName = JSON.parse(document.getElementById('player-name').textContent)
 const iHaveGameCode = JSON.parse(document.getElementById('i-have-game-code').textContent)
 const gameMatrixId = JSON.parse(document.getElementById('game-matrix-id').textContent)
+const boardSize = JSON.parse(document.getElementById('board-size').textContent)
+const winLength = JSON.parse(document.getElementById('win-length').textContent)
 
-var ws = new WebSocket('ws://127.0.0.1:8000/ws/asc/pg/' + gameCode + '/' + gameMatrixId + '/' + playerName + '/' + iHaveGameCode + '/')
+const wsUrl = 'ws://127.0.0.1:8000/ws/asc/pg/' + gameCode + '/' + gameMatrixId + '/' + playerName + '/' + iHaveGameCode + '/' + boardSize + '/' + winLength + '/'
+
+// The server keeps our seat for a while after a drop; reconnecting with the
+// token it gave us replays only the moves we missed.
+let resumeToken = null
+let movesSeen = 0
+let gameOver = false
+var ws = null
 
 let playerSymbol = 'X'
 if (iHaveGameCode == 'on') {
     playerSymbol = 'O'
 }
 
-ws.onopen = function(){
-    console.log('connection established...')
+function connect(){
+    let url = wsUrl
+    if (resumeToken != null) {
+        url += '?resume=' + encodeURIComponent(resumeToken) + '&seen=' + movesSeen
+    }
+    ws = new WebSocket(url, ['ttt.v1.json'])
+    ws.onopen = function(){
+        console.log('connection established...')
+    }
+    ws.onmessage = onMessage
+    ws.onclose = function(event){
+        // 4404: the game was reaped, there is nothing to resume.
+        if (!gameOver && resumeToken != null && event.code != 4404) {
+            setTimeout(connect, 1000)
+        }
+    }
+    ws.onerror = function (event) {
+        console.log('connection aborted...', event)
+    }
 }
 
 function func(box_id){
@@ -21,21 +47,49 @@ function func(box_id){
     }    
 }
 
-ws.onmessage = function(event){
-    var data = JSON.parse(event.data)
-    if (data.msg_type == 'result') {
-        var result = (data.msg == 'game drawn') ? ('Game Drawn 😄😄') : (data.msg + ' Wins... 🥳🥳')
-        document.getElementsByClassName('modal-body')[0].textContent = result
-        document.getElementById('result').click()
-        console.log(data.msg)
+function paintBoard(hex){
+    // Packed board: X cells then O cells, one bit per cell, little-endian bytes.
+    let cells = boardSize * boardSize
+    let width = Math.ceil(cells / 8)
+    for (let cell = 0; cell < cells; cell++) {
+        let shift = cell % 8
+        let x = parseInt(hex.substr(2 * Math.floor(cell / 8), 2), 16) >> shift & 1
+        let o = parseInt(hex.substr(2 * (width + Math.floor(cell / 8)), 2), 16) >> shift & 1
+        document.getElementById(cell + 1).textContent = x ? 'X' : (o ? 'O' : '')
     }
-    else if(data.msg_type == 'chance'){
+}
+
+function showResult(data){
+    gameOver = true
+    var result = (data.o == 3) ? ('Game Drawn 😄😄') : ((data.w || (data.o == 1 ? 'X' : 'O')) + ' Wins... 🥳🥳')
+    document.getElementsByClassName('modal-body')[0].textContent = result
+    document.getElementById('result').click()
+    console.log(result)
+}
 
-        var symbol = data.symbol == 'null' ? 'X': 'O'
-        document.getElementById(data.position).textContent = symbol
+// One frame per move: p = position, s = 1 for X / 2 for O, h = board hash,
+// o = outcome (0 ongoing, 1 X wins, 2 O wins, 3 draw), w = winner's name.
+// r carries a resume token and b a whole board after a long absence.
+function onMessage(event){
+    var data = JSON.parse(event.data)
+    if (data.r !== undefined) {
+        resumeToken = data.r
+        movesSeen = data.n
+        return
+    }
+    if (data.b !== undefined) {
+        paintBoard(data.b)
+        movesSeen = data.n
+        if (data.o != 0) {
+            showResult(data)
+        }
+        return
+    }
+    document.getElementById(data.p).textContent = data.s == 1 ? 'X' : 'O'
+    movesSeen += 1
+    if (data.o != 0) {
+        showResult(data)
     }
 }
 
-ws.onerror = function (event) {
-    console.log('connection aborted...', event)
-}
\ No newline at end of file
+connect()
\ No newline at end of file
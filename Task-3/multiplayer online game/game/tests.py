@@ -1,3 +1,45 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+from .engine import GameEngine
+from .models import GameMatrix, GameRecord, TournamentEntry
+from .protocol import OUTCOME_X_WINS, OUTCOME_O_WINS
+from .tournaments import advance, create_tournament, start_round
 
-# Create your tests here.
+
+class TournamentTests(TestCase):
+    def test_round_settled_over_two_advances(self):
+        tournament = create_tournament('cup', ['a', 'b', 'c', 'd'], rounds=2)
+        first, second = start_round(tournament.id)
+
+        GameRecord.objects.filter(game_matrix_id=first.game_matrix_id).update(result=OUTCOME_X_WINS)
+        self.assertFalse(advance(tournament.id))
+        GameRecord.objects.filter(game_matrix_id=second.game_matrix_id).update(result=OUTCOME_O_WINS)
+        self.assertTrue(advance(tournament.id))
+
+        scores = dict(TournamentEntry.objects.values_list('player_name', 'score'))
+        self.assertEqual(scores[first.creator], 1.0)
+        self.assertEqual(scores[first.opponent], 0.0)
+        self.assertEqual(scores[second.creator], 0.0)
+        self.assertEqual(scores[second.opponent], 1.0)
+        tournament.refresh_from_db()
+        self.assertEqual(tournament.current_round, 2)
+
+
+class EngineTests(TransactionTestCase):
+    # The engine's reads and writes run on the game's own database threads.
+
+    async def test_cached_board_of_another_matrix_is_not_played(self):
+        engine = GameEngine()
+        old = await GameMatrix.objects.acreate(game_code='111111')
+        new = await GameMatrix.objects.acreate(game_code='222222')
+        await engine.move('111111', old.id, 5, 'null')
+        await engine.move('111111', new.id, 1, 'null')
+        self.assertEqual(engine.get('111111').matrix_id, new.id)
+        await engine.discard('111111')
+
+    async def test_discard_writes_buffered_moves(self):
+        engine = GameEngine()
+        game_matrix = await GameMatrix.objects.acreate(game_code='111111')
+        await engine.move('111111', game_matrix.id, 5, 'null')
+        await engine.discard('111111')
+        await game_matrix.arefresh_from_db()
+        self.assertEqual(game_matrix.get_boards(), (1 << 4, 0))
@@ -0,0 +1,41 @@
+import time
+from django.conf import settings
+
+
+def move_rate():
+    return getattr(settings, 'GAME_MOVE_RATE', 4.0)
+
+
+def move_burst():
+    return getattr(settings, 'GAME_MOVE_BURST', 8)
+
+
+# Seconds a connection waits for its last move to be echoed before it may
+# send another anyway (the owner may have gone away).
+MOVE_TIMEOUT = 5.0
+
+
+class TokenBucket:
+    """Allows `rate` events a second on average, with bursts of up to `capacity`.
+
+    A rate of 0 means unlimited.
+    """
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'stamp')
+
+    def __init__(self, rate=None, capacity=None):
+        self.rate = move_rate() if rate is None else rate
+        self.capacity = move_burst() if capacity is None else capacity
+        self.tokens = float(self.capacity)
+        self.stamp = time.monotonic()
+
+    def take(self):
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
@@ -0,0 +1,207 @@
+import math
+from collections import namedtuple
+from django.db import transaction
+from . import bitboard
+from .matchmaking import codes
+from .models import Game, GameMatrix, GameRecord, PlayerRating, Tournament, TournamentEntry, TournamentMatch
+from .protocol import OUTCOME_ONGOING, OUTCOME_X_WINS, OUTCOME_O_WINS, OUTCOME_DRAW
+
+# Points for a win, a draw and a bye in a swiss round.
+WIN_POINTS = 1.0
+DRAW_POINTS = 0.5
+BYE_POINTS = 1.0
+
+# A pairing; opponent is None for a bye.
+Pairing = namedtuple('Pairing', 'creator opponent')
+
+
+def create_tournament(name, players, format=Tournament.SWISS, board_size=bitboard.DEFAULT_SIZE,
+                      win_length=bitboard.DEFAULT_WIN_LENGTH, rounds=None):
+    """Register a tournament, seeding players by rating (unrated players last)."""
+    players = list(dict.fromkeys(players))
+    if len(players) < 2:
+        raise ValueError('a tournament needs at least two players')
+    ratings = dict(PlayerRating.objects.filter(name__in=players).values_list('name', 'rating'))
+    seeded = sorted(players, key=lambda name: -ratings.get(name, 0.0))
+    if rounds is None:
+        rounds = math.ceil(math.log2(len(players)))
+    with transaction.atomic():
+        tournament = Tournament.objects.create(
+            name=name, format=format, board_size=board_size, win_length=win_length, rounds=rounds,
+        )
+        TournamentEntry.objects.bulk_create([
+            TournamentEntry(tournament=tournament, player_name=name, seed=seed)
+            for seed, name in enumerate(seeded, 1)
+        ])
+    return tournament
+
+
+def swiss_pairings(entries, played):
+    """Pair players on equal or nearby scores, avoiding rematches where possible.
+
+    entries are ranked best first; played holds frozensets of names that have
+    already met. With an odd count the lowest-ranked player with the fewest
+    byes sits the round out.
+    """
+    ranked = sorted(entries, key=lambda entry: (-entry.score, entry.seed))
+    pairings = []
+    if len(ranked) % 2:
+        bye = min(reversed(ranked), key=lambda entry: entry.byes)
+        ranked.remove(bye)
+        pairings.append(Pairing(bye.player_name, None))
+    names = [entry.player_name for entry in ranked]
+    while names:
+        first = names.pop(0)
+        index = next((i for i, name in enumerate(names) if frozenset((first, name)) not in played), 0)
+        pairings.append(Pairing(first, names.pop(index)))
+    return pairings
+
+
+def knockout_pairings(entries):
+    # Best seed against worst among those still in; the top seed takes any bye.
+    remaining = sorted((entry for entry in entries if not entry.eliminated), key=lambda entry: entry.seed)
+    pairings = []
+    if len(remaining) % 2:
+        pairings.append(Pairing(remaining.pop(0).player_name, None))
+    half = len(remaining) // 2
+    for high, low in zip(remaining[:half], reversed(remaining[half:])):
+        pairings.append(Pairing(high.player_name, low.player_name))
+    return pairings
+
+
+def start_round(tournament_id):
+    """Pair the next round and create all of its games in one transaction.
+
+    Every GameMatrix, Game and GameRecord for the round is written with a
+    handful of bulk inserts, so players only have to connect to their code.
+    """
+    with transaction.atomic():
+        tournament = Tournament.objects.select_for_update().get(pk=tournament_id)
+        entries = list(tournament.entries.all())
+        if tournament.format == Tournament.KNOCKOUT:
+            pairings = knockout_pairings(entries)
+        else:
+            played = {
+                frozenset(pair) for pair in
+                tournament.matches.exclude(opponent='').values_list('creator', 'opponent')
+            }
+            pairings = swiss_pairings(entries, played)
+
+        games = [pairing for pairing in pairings if pairing.opponent is not None]
+        matrices = codes.create_matrices(len(games), board_size=tournament.board_size, win_length=tournament.win_length)
+        Game.objects.bulk_create([
+            Game(game_code=matrix.game_code, game_creator=creator, game_opponent=opponent, game_matrix=matrix)
+            for matrix, (creator, opponent) in zip(matrices, games)
+        ])
+        GameRecord.objects.bulk_create([
+            GameRecord(
+                game_matrix_id=matrix.id, game_code=matrix.game_code, game_creator=creator, game_opponent=opponent,
+                board_size=tournament.board_size, win_length=tournament.win_length,
+            )
+            for matrix, (creator, opponent) in zip(matrices, games)
+        ], ignore_conflicts=True)
+
+        round_number = tournament.current_round + 1
+        matches = [
+            TournamentMatch(
+                tournament=tournament, round=round_number, creator=creator, opponent=opponent,
+                game_code=matrix.game_code, game_matrix_id=matrix.id,
+            )
+            for matrix, (creator, opponent) in zip(matrices, games)
+        ]
+        byes = {pairing.creator for pairing in pairings if pairing.opponent is None}
+        matches.extend(
+            TournamentMatch(tournament=tournament, round=round_number, creator=name, result=OUTCOME_X_WINS)
+            for name in byes
+        )
+        TournamentMatch.objects.bulk_create(matches)
+        if byes and tournament.format == Tournament.SWISS:
+            bye_entries = [entry for entry in entries if entry.player_name in byes]
+            for entry in bye_entries:
+                entry.score += BYE_POINTS
+                entry.byes += 1
+            TournamentEntry.objects.bulk_update(bye_entries, ['score', 'byes'])
+
+        tournament.current_round = round_number
+        tournament.status = Tournament.RUNNING
+        tournament.save(update_fields=['current_round', 'status'])
+    return matches
+
+
+def _settle(match, result, entries, knockout):
+    creator = entries[match.creator]
+    opponent = entries[match.opponent]
+    if knockout:
+        if result == OUTCOME_DRAW:
+            # No replays: a drawn or abandoned tie goes to the better seed.
+            loser = opponent if creator.seed < opponent.seed else creator
+        else:
+            loser = opponent if result == OUTCOME_X_WINS else creator
+        loser.eliminated = True
+    elif result == OUTCOME_X_WINS:
+        creator.score += WIN_POINTS
+    elif result == OUTCOME_O_WINS:
+        opponent.score += WIN_POINTS
+    else:
+        creator.score += DRAW_POINTS
+        opponent.score += DRAW_POINTS
+
+
+def advance(tournament_id):
+    """Score the current round if every game in it is over, then start the next.
+
+    Results are read from the games' GameRecords. A game whose GameMatrix is
+    gone without a result (abandoned or reaped) counts as a draw. Safe to call
+    repeatedly, e.g. from cron; returns True when the round was closed.
+    """
+    with transaction.atomic():
+        tournament = Tournament.objects.select_for_update().get(pk=tournament_id)
+        if tournament.status != Tournament.RUNNING:
+            return False
+        open_matches = list(tournament.matches.filter(round=tournament.current_round, result=OUTCOME_ONGOING))
+        matrix_ids = [match.game_matrix_id for match in open_matches]
+        results = dict(
+            GameRecord.objects.filter(game_matrix_id__in=matrix_ids)
+            .exclude(result=OUTCOME_ONGOING).values_list('game_matrix_id', 'result')
+        )
+        live = set(GameMatrix.objects.filter(id__in=matrix_ids).values_list('id', flat=True))
+
+        settled = []
+        for match in open_matches:
+            if match.game_matrix_id in results:
+                match.result = results[match.game_matrix_id]
+            elif match.game_matrix_id not in live:
+                match.result = OUTCOME_DRAW
+            else:
+                continue
+            settled.append(match)
+        TournamentMatch.objects.bulk_update(settled, ['result'])
+        if len(settled) < len(open_matches):
+            return False
+
+        # Every game of the round, including any that settled in an earlier call.
+        played = tournament.matches.filter(round=tournament.current_round).exclude(opponent='')
+        entries = {entry.player_name: entry for entry in tournament.entries.all()}
+        knockout = tournament.format == Tournament.KNOCKOUT
+        for match in played:
+            _settle(match, match.result, entries, knockout)
+        TournamentEntry.objects.bulk_update(list(entries.values()), ['score', 'eliminated'])
+
+        if knockout:
+            finished = sum(not entry.eliminated for entry in entries.values()) <= 1
+        else:
+            finished = tournament.current_round >= tournament.rounds
+        if finished:
+            tournament.status = Tournament.FINISHED
+            tournament.save(update_fields=['status'])
+        else:
+            start_round(tournament_id)
+    return True
+
+
+def standings(tournament):
+    entries = tournament.entries.order_by('eliminated', '-score', 'seed')
+    return [
+        {'player': entry.player_name, 'seed': entry.seed, 'score': entry.score, 'eliminated': entry.eliminated}
+        for entry in entries
+    ]
@@ -4,4 +4,8 @@ from . import views
 urlpatterns =[
     path('', views.index, name='home'),
     path('game/', views.game, name='game'),
+    path('leaderboard/', views.leaderboard, name='leaderboard'),
+    path('leaderboard/<str:player_name>/', views.player_rank, name='player_rank'),
+    path('tournaments/<int:tournament_id>/', views.tournament, name='tournament'),
+    path('games/<int:game_matrix_id>/analysis/', views.analysis, name='analysis'),
 ]
\ No newline at end of file
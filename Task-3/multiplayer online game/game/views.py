@@ -1,24 +1,89 @@
-from django.shortcuts import render, HttpResponse
+from django.shortcuts import render, HttpResponse, get_object_or_404
+from django.http import JsonResponse
 from .forms import PlayerForm
-from .models import GameMatrix
-import random
+from .models import GameMatrix, GameRecord, Tournament
+from .matchmaking import codes
+from .ai import AI
+from .analysis import BLUNDER, analyzer
+from .ratings import leaderboard as ratings_board
+from .tournaments import standings
 
 # Create your views here.
 def index(request):
-    game_code = str(random.randint(111111,999999))
+    game_code = codes.allocate()
     player_form = PlayerForm(initial={'game_code': game_code})
     return render(request, 'game/index.html', {'player_form':player_form})
 
 def game(request):
-    game_matrix, created = GameMatrix.objects.get_or_create(game_code=request.POST.get('game_code'))
+    board_size, win_length = PlayerForm(request.POST).get_variant()
+    game_matrix, created = GameMatrix.objects.get_or_create(
+        game_code=request.POST.get('game_code'),
+        defaults={'board_size': board_size, 'win_length': win_length},
+    )
     game_matrix_id = game_matrix.id
     if(request.method == 'POST'):
+        # A joining player always gets the variant the creator picked.
+        board_size = game_matrix.board_size
         data = {
             'player_name': request.POST.get('player_name'),
             'game_code': request.POST.get('game_code'),
-            'i_have_game_code': request.POST.get('i_have_game_code'),
+            'i_have_game_code': AI if request.POST.get('play_computer') else request.POST.get('i_have_game_code'),
             'game_matrix_id': game_matrix_id,
+            'board_size': board_size,
+            'win_length': game_matrix.win_length,
+            'board_rows': [range(row * board_size + 1, (row + 1) * board_size + 1) for row in range(board_size)],
         }
         return render(request, 'game/game.html', data)
     else:
-        return HttpResponse('<h1>Bad Request...</h1>')
\ No newline at end of file
+        return HttpResponse('<h1>Bad Request...</h1>')
+
+def leaderboard(request):
+    # Served from the in-memory leaderboard; the list itself is cached for GAME_LEADERBOARD_TTL.
+    try:
+        count = min(max(int(request.GET.get('n', 10)), 1), 100)
+    except ValueError:
+        count = 10
+    if(ratings_board.stale()):
+        ratings_board.refresh()
+    return JsonResponse({'players': ratings_board.top(count)})
+
+def player_rank(request, player_name):
+    if(ratings_board.stale()):
+        ratings_board.refresh()
+    rating = ratings_board.rating(player_name)
+    if(rating is None):
+        return JsonResponse({'name': player_name, 'rating': None, 'rank': None}, status=404)
+    return JsonResponse({'name': player_name, 'rating': round(rating, 1), 'rank': ratings_board.rank(player_name)})
+
+def tournament(request, tournament_id):
+    # Players find their game code for the current round here and join it from the home page.
+    tournament = get_object_or_404(Tournament, pk=tournament_id)
+    matches = tournament.matches.filter(round=tournament.current_round)
+    return JsonResponse({
+        'name': tournament.name,
+        'format': tournament.format,
+        'board_size': tournament.board_size,
+        'win_length': tournament.win_length,
+        'round': tournament.current_round,
+        'rounds': tournament.rounds,
+        'status': tournament.status,
+        'matches': [
+            {'creator': match.creator, 'opponent': match.opponent or None, 'game_code': match.game_code or None, 'result': match.result}
+            for match in matches
+        ],
+        'standings': standings(tournament),
+    })
+
+async def analysis(request, game_matrix_id):
+    # The search runs in the analysis process pool; this only awaits its result.
+    try:
+        reviews = await analyzer.submit(game_matrix_id)
+    except GameRecord.DoesNotExist:
+        return JsonResponse({'error': 'no such game'}, status=404)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=409)
+    return JsonResponse({
+        'game_matrix_id': game_matrix_id,
+        'moves': [review._asdict() for review in reviews],
+        'blunders': sum(review.verdict == BLUNDER for review in reviews),
+    })
\ No newline at end of file
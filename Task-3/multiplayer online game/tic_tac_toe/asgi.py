@@ -1,13 +1,19 @@
 import os
 from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.routing import ProtocolTypeRouter, URLRouter, ChannelNameRouter
 import game.routing
+from game.consumers import handle_shard_message
+from game.metrics import MetricsMiddleware
+from game.sharding import ListenerMiddleware
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tic_tac_toe.settings')
 
-application = ProtocolTypeRouter({
-    'http':get_asgi_application(),
+application = ListenerMiddleware(ProtocolTypeRouter({
+    'http':MetricsMiddleware(get_asgi_application()),
     'websocket': URLRouter(
         game.routing.websocket_urlpatterns
-    )
-})
+    ),
+    'channel': ChannelNameRouter(
+        game.routing.channel_routes
+    ),
+}), handle_shard_message)
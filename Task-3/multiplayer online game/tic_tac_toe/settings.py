@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -125,11 +126,69 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels_redis.core.RedisChannelLayer",
-        "CONFIG": {
-            "hosts": [("localhost", 6379)],
+# Games are sharded across GAME_SHARDS workers by game code; each worker
+# process is started with its own GAME_SHARD_ID (0 .. GAME_SHARDS - 1).
+GAME_SHARDS = int(os.environ.get('GAME_SHARDS', 1))
+GAME_SHARD_ID = int(os.environ.get('GAME_SHARD_ID', 0))
+
+# Threads each worker gives to multi-statement game DB work (lobby joins, match creation).
+GAME_DB_THREADS = 4
+
+# Seconds a worker may answer reconnects from its cached copy of a lobby; 0 disables it.
+GAME_LOBBY_CACHE_TTL = 5.0
+
+# Moves a spectator may fall behind before it is switched to board snapshots.
+GAME_SPECTATOR_QUEUE = 32
+
+# Seconds a dropped player's seat and board are kept for them to resume; 0 closes at once.
+GAME_RESUME_GRACE = 30.0
+
+# Seconds the AI may think on boards bigger than 3x3, and the processes it searches in.
+GAME_AI_BUDGET = 0.5
+GAME_AI_PROCESSES = 2
+
+# Reaper: sweep every GAME_REAP_INTERVAL seconds (0 disables it), dropping
+# lobbies nobody joined within GAME_LOBBY_TTL and games idle for GAME_IDLE_TTL.
+GAME_REAP_INTERVAL = 60.0
+GAME_LOBBY_TTL = 600.0
+GAME_IDLE_TTL = 3600.0
+
+# Per-connection move throttle: sustained moves a second and burst size (rate 0 disables it).
+GAME_MOVE_RATE = 4.0
+GAME_MOVE_BURST = 8
+
+# HTTP path each worker serves its Prometheus metrics on.
+GAME_METRICS_PATH = '/metrics'
+
+# Elo: rating changes are written every GAME_RATING_FLUSH_INTERVAL seconds or
+# once GAME_RATING_FLUSH_BATCH players are waiting; /leaderboard/ is cached for GAME_LEADERBOARD_TTL.
+# GAME_RATED = False stops rating games altogether (load runs).
+GAME_RATED = True
+GAME_RATING_FLUSH_INTERVAL = 5.0
+GAME_RATING_FLUSH_BATCH = 200
+GAME_LEADERBOARD_TTL = 10.0
+
+# Post-game analysis: search seconds per position on big boards, worker
+# processes, and positions kept in the per-worker evaluation cache.
+GAME_ANALYSIS_BUDGET = 0.2
+GAME_ANALYSIS_PROCESSES = 1
+GAME_ANALYSIS_CACHE = 50000
+
+# 'redis' for multi-node deployments, 'memory' for a single node, tests and load runs.
+GAME_CHANNEL_LAYER = os.environ.get('GAME_CHANNEL_LAYER', 'redis')
+
+if GAME_CHANNEL_LAYER == 'memory':
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "game.layers.InProcessChannelLayer",
         },
-    },
-}
\ No newline at end of file
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "game.layers.BatchedRedisChannelLayer",
+            "CONFIG": {
+                "hosts": [("localhost", 6379)],
+            },
+        },
+    }
\ No newline at end of file